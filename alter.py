@@ -1,10 +1,17 @@
 import json
 import os
+import re
 from datetime import datetime
 
 # Define the base directory for the project
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))  # This can be set to a different path if needed
 
+# InnoDB ALTER TABLE algorithms from cheapest to most expensive
+ALGORITHM_COST = ['INSTANT', 'INPLACE', 'COPY']
+# Expression defaults of temporal columns, which the schema cache quotes like string literals
+TEMPORAL_TYPES = ('datetime', 'timestamp', 'date', 'time')
+EXPRESSION_DEFAULT = re.compile(r"DEFAULT '((?:CURRENT_TIMESTAMP|LOCALTIMESTAMP|LOCALTIME)(?:\(\d*\))?|NOW\(\d*\))'")
+
 def load_schema(file_path):
     """Load schema from a JSON file."""
     try:
@@ -21,14 +28,146 @@ def translate_column_definition(col_definition):
     """Translate column definitions to SQL syntax."""
     # Replace AI with AUTO_INCREMENT and PK with PRIMARY KEY
     col_definition = col_definition.replace("AI", "AUTO_INCREMENT").replace("PK", "PRIMARY KEY")
+    # DEFAULT 'CURRENT_TIMESTAMP' is not a valid datetime literal, the expression must stay unquoted
+    if re.match(r"\s*(\w+)", col_definition).group(1).lower() in TEMPORAL_TYPES:
+        col_definition = EXPRESSION_DEFAULT.sub(r"DEFAULT \1", col_definition)
     return col_definition
 
-def compare_and_generate_statements(latest_schema, old_schema, db_name):
-    """Compare schemas and generate ALTER TABLE and CREATE TABLE statements."""
+def classify_add_column(col_definition, indexes=None, options=None):
+    """Return the cheapest algorithm InnoDB can use to add a column with this definition.
+
+    indexes and options are the table's current ones from the schema cache: INSTANT is not
+    available on tables with a FULLTEXT index or with ROW_FORMAT=COMPRESSED.
+    """
+    if any(flag in col_definition for flag in ('PRIMARY KEY', 'UNIQUE', 'AUTO_INCREMENT', 'STORED')):
+        return 'COPY'
+    if any(index.get('type') == 'FULLTEXT' for index in (indexes or {}).values()):
+        return 'COPY'  # Leave the algorithm to the server, the hidden FTS_DOC_ID column may force a copy
+    if ((options or {}).get('row_format') or '').upper() == 'COMPRESSED':
+        return 'INPLACE'
+    return 'INSTANT'  # MySQL 8.0.12+ appends columns at the end of the table without a rebuild
+
+def build_alter_statement(table_name, clauses, online_ddl=False):
+    """Merge all clauses for a table into one ALTER TABLE, adding ALGORITHM/LOCK when every clause allows it.
+
+    A table is touched once no matter how many changes it has. The strictest algorithm among the
+    clauses decides: INSTANT, INPLACE with LOCK=NONE, or no clause at all when a copy is needed,
+    so the server picks the safe table-copying form.
+    """
+    algorithm = max((clause_algorithm for _, clause_algorithm in clauses), key=ALGORITHM_COST.index)
+    parts = [clause for clause, _ in clauses]
+    if online_ddl and algorithm == 'INSTANT':
+        parts.append("ALGORITHM=INSTANT")
+    elif online_ddl and algorithm == 'INPLACE':
+        parts.append("ALGORITHM=INPLACE, LOCK=NONE")
+    return f"ALTER TABLE `{table_name}`\n    " + ',\n    '.join(parts) + ";"
+
+def format_key_columns(columns):
+    """Quote index columns, keeping prefix lengths such as name(10)."""
+    parts = []
+    for column in columns:
+        match = re.match(r"^(.*)\((\d+)\)$", column)
+        parts.append(f"`{match.group(1)}`({match.group(2)})" if match else f"`{column}`")
+    return ', '.join(parts)
+
+def build_index_definition(index_name, index):
+    """Build the index part of CREATE TABLE / ADD, e.g. UNIQUE INDEX `name` (`a`, `b`)."""
+    if index.get('type') in ('FULLTEXT', 'SPATIAL'):
+        kind = f"{index['type']} INDEX"
+    elif index.get('unique'):
+        kind = "UNIQUE INDEX"
+    else:
+        kind = "INDEX"
+    return f"{kind} `{index_name}` ({format_key_columns(index['columns'])})"
+
+def build_foreign_key_definition(fk_name, foreign_key):
+    """Build the CONSTRAINT ... FOREIGN KEY ... REFERENCES part of CREATE TABLE / ADD."""
+    definition = (f"CONSTRAINT `{fk_name}` FOREIGN KEY ({format_key_columns(foreign_key['columns'])}) "
+                  f"REFERENCES `{foreign_key['referenced_table']}` "
+                  f"({format_key_columns(foreign_key['referenced_columns'])})")
+    if foreign_key.get('on_update', 'RESTRICT') not in ('RESTRICT', 'NO ACTION'):
+        definition += f" ON UPDATE {foreign_key['on_update']}"
+    if foreign_key.get('on_delete', 'RESTRICT') not in ('RESTRICT', 'NO ACTION'):
+        definition += f" ON DELETE {foreign_key['on_delete']}"
+    return definition
+
+def compare_indexes(table_name, latest_indexes, old_indexes):
+    """Return the DROP INDEX and ADD INDEX clauses that turn old_indexes into latest_indexes."""
+    drops, adds = [], []
+    for index_name, index in old_indexes.items():
+        if index_name not in latest_indexes or latest_indexes[index_name] != index:
+            drops.append((f"DROP INDEX `{index_name}`", 'INPLACE'))
+            print(f"Dropped index '{index_name}' in table '{table_name}'.")
+    for index_name, index in latest_indexes.items():
+        if index_name not in old_indexes or old_indexes[index_name] != index:
+            # FULLTEXT and SPATIAL indexes are built in place but cannot allow concurrent writes
+            algorithm = 'COPY' if index.get('type') in ('FULLTEXT', 'SPATIAL') else 'INPLACE'
+            adds.append((f"ADD {build_index_definition(index_name, index)}", algorithm))
+            print(f"Missing index '{index_name}' in table '{table_name}'.")
+    return drops, adds
+
+def compare_foreign_keys(table_name, latest_foreign_keys, old_foreign_keys):
+    """Return the DROP FOREIGN KEY and ADD CONSTRAINT clauses that turn old into latest foreign keys."""
+    drops, adds = [], []
+    for fk_name, foreign_key in old_foreign_keys.items():
+        if fk_name not in latest_foreign_keys or latest_foreign_keys[fk_name] != foreign_key:
+            drops.append((f"DROP FOREIGN KEY `{fk_name}`", 'INPLACE'))
+            print(f"Dropped foreign key '{fk_name}' in table '{table_name}'.")
+    for fk_name, foreign_key in latest_foreign_keys.items():
+        if fk_name not in old_foreign_keys or old_foreign_keys[fk_name] != foreign_key:
+            # Adding a foreign key is only done in place with foreign_key_checks off, so assume a copy
+            adds.append((f"ADD {build_foreign_key_definition(fk_name, foreign_key)}", 'COPY'))
+            print(f"Missing foreign key '{fk_name}' in table '{table_name}'.")
+    return drops, adds
+
+def compare_table_options(table_name, latest_options, old_options):
+    """Return ENGINE / ROW_FORMAT clauses for options that differ."""
+    clauses = []
+    if latest_options.get('engine') and latest_options.get('engine') != old_options.get('engine'):
+        clauses.append((f"ENGINE={latest_options['engine']}", 'COPY'))
+        print(f"Changed engine of table '{table_name}'.")
+    if latest_options.get('row_format') and latest_options.get('row_format') != old_options.get('row_format'):
+        clauses.append((f"ROW_FORMAT={latest_options['row_format'].upper()}", 'INPLACE'))
+        print(f"Changed row format of table '{table_name}'.")
+    return clauses
+
+def build_create_table_statement(table_name, table_info):
+    """Build CREATE TABLE with the columns, secondary indexes and table options of a snapshot entry.
+
+    Foreign keys are left out, they are added by ALTER TABLE once every table exists.
+    """
+    definitions = []
+    for col_name, col_definition in table_info['columns'].items():
+        translated_definition = translate_column_definition(col_definition)
+        definitions.append(f"`{col_name}` {translated_definition}")
+    for index_name, index in table_info.get('indexes', {}).items():
+        definitions.append(build_index_definition(index_name, index))
+    definitions_str = ',\n    '.join(definitions)  # Indent for readability
+
+    options = table_info.get('options', {})
+    table_options = ''
+    if options.get('engine'):
+        table_options += f" ENGINE={options['engine']}"
+    if options.get('row_format'):
+        table_options += f" ROW_FORMAT={options['row_format'].upper()}"
+    return f"CREATE TABLE IF NOT EXISTS `{table_name}` (\n    {definitions_str}\n){table_options};\n"
+
+def compare_and_generate_statements(latest_schema, old_schema, db_name, online_ddl=False):
+    """Compare schemas and generate ALTER TABLE and CREATE TABLE statements.
+
+    New columns, secondary indexes, foreign keys and table options are compared; changed columns
+    are only reported. All changes to a table
+    are merged into a single ALTER TABLE; see build_alter_statement for online_ddl. Foreign keys are
+    the exception: MySQL cannot drop and re-add a constraint in one ALTER, so dropped ones get an
+    ALTER of their own that comes first, and added ones an ALTER at the end, once every index and
+    table they rely on exists. The CREATE TABLE statements must run first, since the ALTER TABLE
+    statements may add foreign keys to the new tables.
+    """
     alter_statements = []
     create_statements = []
+    fk_drop_statements, fk_add_statements = [], []
 
-    # Check for missing columns in existing tables
+    # Check for missing and changed columns in existing tables
     for table_name, old_info in old_schema.items():
         if table_name not in latest_schema:
             print(f"Table '{table_name}' does not exist in the latest schema.")
@@ -36,40 +175,74 @@ def compare_and_generate_statements(latest_schema, old_schema, db_name):
         
         old_columns = old_schema[table_name]['columns']
         latest_columns = latest_schema[table_name]['columns']
+        clauses = []
 
         for col_name, col_definition in latest_columns.items():
+            # Translate column definition
+            translated_definition = translate_column_definition(col_definition)
             if col_name not in old_columns:
-                # Translate column definition
-                translated_definition = translate_column_definition(col_definition)
-                # Generate ALTER TABLE statement
-                alter_statement = f"ALTER TABLE `{table_name}` ADD COLUMN `{col_name}` {translated_definition};"
-                alter_statements.append(alter_statement)
-                print(f"Missing column '{col_name}' in table '{table_name}'. Generated: {alter_statement}")
+                clauses.append((f"ADD COLUMN `{col_name}` {translated_definition}",
+                                classify_add_column(translated_definition, old_info.get('indexes'),
+                                                    old_info.get('options'))))
+                print(f"Missing column '{col_name}' in table '{table_name}'.")
+            elif translate_column_definition(old_columns[col_name]) != translated_definition:
+                # The schema cache drops precision, UNSIGNED, ENUM values, charsets and ON UPDATE, so a
+                # MODIFY COLUMN built from it could damage the column; it has to be written by hand
+                print(f"Changed column '{col_name}' in table '{table_name}': "
+                      f"'{old_columns[col_name]}' -> '{col_definition}'. Write its MODIFY COLUMN by hand.")
+
+        # Snapshots taken before indexes, foreign keys and options were recorded cannot be diffed on them
+        index_drops, index_adds = [], []
+        if 'indexes' in old_info and 'indexes' in latest_schema[table_name]:
+            index_drops, index_adds = compare_indexes(table_name, latest_schema[table_name]['indexes'],
+                                                      old_info['indexes'])
+        fk_drops, fk_adds = [], []
+        if 'foreign_keys' in old_info and 'foreign_keys' in latest_schema[table_name]:
+            fk_drops, fk_adds = compare_foreign_keys(table_name, latest_schema[table_name]['foreign_keys'],
+                                                     old_info['foreign_keys'])
+        if 'options' in old_info and 'options' in latest_schema[table_name]:
+            clauses += compare_table_options(table_name, latest_schema[table_name]['options'], old_info['options'])
+
+        clauses = index_drops + clauses + index_adds
+
+        if fk_drops:
+            fk_drop_statements.append(build_alter_statement(table_name, fk_drops, online_ddl))
+            print(f"Generated: {fk_drop_statements[-1]}")
+        if clauses:
+            # Generate one ALTER TABLE statement for all other changes of the table
+            alter_statement = build_alter_statement(table_name, clauses, online_ddl)
+            alter_statements.append(alter_statement)
+            print(f"Generated: {alter_statement}")
+        if fk_adds:
+            fk_add_statements.append(build_alter_statement(table_name, fk_adds, online_ddl))
+            print(f"Generated: {fk_add_statements[-1]}")
 
     # Check for missing tables in the old schema
     for table_name, latest_info in latest_schema.items():
         if table_name not in old_schema:
             # Generate CREATE TABLE statement
-            columns_with_types = []
-            for col_name, col_definition in latest_info['columns'].items():
-                translated_definition = translate_column_definition(col_definition)
-                columns_with_types.append(f"`{col_name}` {translated_definition}")
-            columns_with_types_str = ',\n    '.join(columns_with_types)  # Indent for readability
-            create_table_sql = f"CREATE TABLE IF NOT EXISTS `{table_name}` (\n    {columns_with_types_str}\n);\n"
+            create_table_sql = build_create_table_statement(table_name, latest_info)
             create_statements.append(create_table_sql)
             print(f"Table '{table_name}' is missing. Generated: {create_table_sql}")
 
-    return alter_statements, create_statements
+            # Foreign keys of new tables may reference other new tables, so they are added after every CREATE
+            fk_clauses = [(f"ADD {build_foreign_key_definition(fk_name, foreign_key)}", 'COPY')
+                          for fk_name, foreign_key in latest_info.get('foreign_keys', {}).items()]
+            if fk_clauses:
+                fk_add_statements.append(build_alter_statement(table_name, fk_clauses, online_ddl))
+
+    return fk_drop_statements + alter_statements + fk_add_statements, create_statements
 
 def main():
     local_schema_file = os.path.join(BASE_DIR, 'schema/latest_schema.json') 
     staging_schema_file = os.path.join(BASE_DIR, 'schema/main_staging_schema_cache.json')
     db_name = ''  # Replace with your actual database name
+    online_ddl = True  # Add ALGORITHM=INSTANT/INPLACE, LOCK=NONE where the change allows it (MySQL 8.0.12+)
 
     local_schema = load_schema(local_schema_file)
     staging_schema = load_schema(staging_schema_file)
 
-    alter_statements, create_statements = compare_and_generate_statements(local_schema, staging_schema, db_name)
+    alter_statements, create_statements = compare_and_generate_statements(local_schema, staging_schema, db_name, online_ddl)
 
     # Get current date and time for the filename
     current_time = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -78,12 +251,12 @@ def main():
     # Ensure the migration directory exists; create it if it doesn't
     os.makedirs(os.path.dirname(output_file), exist_ok=True)
 
-    # Write the ALTER and CREATE statements to a file
+    # Write the CREATE and ALTER statements to a file, new tables first so foreign keys can reference them
     with open(output_file, 'w', encoding='utf-8') as f:
-        for statement in alter_statements:
-            f.write(statement + '\n')
         for statement in create_statements:
             f.write(statement + '\n')
+        for statement in alter_statements:
+            f.write(statement + '\n')
 
     print(f"ALTER and CREATE TABLE statements written to '{output_file}'.")
 
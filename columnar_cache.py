@@ -0,0 +1,262 @@
+from typing import Dict, List, Iterable
+import json
+import mmap
+import os
+import time
+import zlib
+from array import array
+from datetime import datetime, date, timedelta
+from decimal import Decimal
+
+try:
+    import zstandard
+except ImportError:  # zstd compression is optional
+    zstandard = None
+
+MANIFEST_FILE = 'manifest.json'
+FORMAT_VERSION = 1
+DATETIME_ORIGIN = datetime(1, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+INT64_RANGE = (-(1 << 63), (1 << 63) - 1)
+
+# Column types stored as fixed-width arrays, with their array typecode
+FIXED_TYPES = {'int': 'q', 'float': 'd', 'bool': 'b', 'date': 'i', 'datetime': 'q', 'time': 'q'}
+# Column types stored as offsets followed by the concatenated encoded values
+VARIABLE_TYPES = ('str', 'bytes', 'decimal', 'json')
+
+def value_type(val) -> str:
+    """Return the column type a non-null Python value is stored as."""
+    if isinstance(val, bool):  # Must come before int, bool is a subclass of int
+        return 'bool'
+    if isinstance(val, int):
+        return 'int' if INT64_RANGE[0] <= val <= INT64_RANGE[1] else 'json'
+    if isinstance(val, float):
+        return 'float'
+    if isinstance(val, Decimal):
+        return 'decimal'
+    if isinstance(val, datetime):  # Must come before date, datetime is a subclass of date
+        return 'datetime' if val.tzinfo is None else 'json'
+    if isinstance(val, date):
+        return 'date'
+    if isinstance(val, timedelta):
+        return 'time'
+    if isinstance(val, (bytes, bytearray)):
+        return 'bytes'
+    if isinstance(val, str):
+        return 'str'
+    return 'json'
+
+def column_type(values: List) -> str:
+    """Pick the type of a column: the type all its non-null values share, otherwise json."""
+    types = {value_type(val) for val in values if val is not None}
+    return types.pop() if len(types) == 1 else 'json'
+
+def pad8(length: int) -> int:
+    """Round a length up to a multiple of 8, so arrays in the block stay aligned."""
+    return (length + 7) & ~7
+
+def encode_fixed(values: List, col_type: str) -> bytes:
+    """Encode a fixed-width column, nulls are stored as 0."""
+    if col_type == 'datetime':
+        values = [0 if val is None else (val - DATETIME_ORIGIN) // MICROSECOND for val in values]
+    elif col_type == 'date':
+        values = [0 if val is None else val.toordinal() for val in values]
+    elif col_type == 'time':
+        values = [0 if val is None else val // MICROSECOND for val in values]
+    else:
+        values = [0 if val is None else val for val in values]
+    return array(FIXED_TYPES[col_type], values).tobytes()
+
+def encode_variable(values: List, col_type: str) -> bytes:
+    """Encode a variable-width column as n + 1 end offsets followed by the values."""
+    parts = []
+    for val in values:
+        if val is None:
+            parts.append(b'')
+        elif col_type == 'bytes':
+            parts.append(bytes(val))
+        elif col_type == 'json':
+            parts.append(json.dumps(val, default=str).encode('utf-8'))
+        else:
+            parts.append(str(val).encode('utf-8'))
+    offsets = array('Q', [0])
+    total = 0
+    for part in parts:
+        total += len(part)
+        offsets.append(total)
+    return offsets.tobytes() + b''.join(parts)
+
+def compress_block(block: bytes, compression: str) -> bytes:
+    """Compress a column block with zlib or zstd, or return it as is."""
+    if compression == 'zlib':
+        return zlib.compress(block, 6)
+    if compression == 'zstd':
+        return zstandard.ZstdCompressor(level=3).compress(block)
+    return block
+
+def decompress_block(block, compression: str, raw_length: int):
+    """Undo compress_block, always returning a copy that outlives the memory map."""
+    if compression == 'zlib':
+        return zlib.decompress(block)
+    if compression == 'zstd':
+        return zstandard.ZstdDecompressor().decompress(block, max_output_size=raw_length)
+    return bytes(block)
+
+def write_columnar_table(cache_dir: str, table_name: str, rows: Iterable[Dict], column_names: List[str] = None,
+                         compression: str = None, generation: str = None) -> Dict:
+    """Write one table to <cache_dir>/<table>[.<generation>].bin, one block per column, and return its manifest entry."""
+    rows = list(rows)
+    if column_names is None:
+        column_names = list(rows[0].keys()) if rows else []
+
+    file_name = f"{table_name}.{generation}.bin" if generation else f"{table_name}.bin"
+    entry = {"rows": len(rows), "file": file_name, "columns": []}
+    part_file = os.path.join(cache_dir, entry['file'] + '.part')
+    with open(part_file, 'wb') as f:
+        offset = 0
+        for col_name in column_names:
+            values = [row.get(col_name) for row in rows]
+            col_type = column_type(values)
+            nulls = sum(val is None for val in values)
+
+            block = b''
+            if nulls:
+                mask = bytes(val is None for val in values)
+                block += mask + b'\0' * (pad8(len(mask)) - len(mask))
+            if col_type in FIXED_TYPES:
+                block += encode_fixed(values, col_type)
+            else:
+                block += encode_variable(values, col_type)
+
+            raw_length = len(block)
+            block = compress_block(block, compression)
+            f.write(block + b'\0' * (pad8(len(block)) - len(block)))
+            entry['columns'].append({
+                "name": col_name,
+                "type": col_type,
+                "nulls": nulls,
+                "offset": offset,
+                "length": len(block),
+                "raw_length": raw_length
+            })
+            offset += pad8(len(block))
+    os.replace(part_file, os.path.join(cache_dir, entry['file']))
+    return entry
+
+def write_columnar_cache(data_cache: Dict, cache_dir: str, schema_cache: Dict = None, compression: str = None) -> Dict:
+    """Write a data cache as a columnar cache directory: a manifest.json plus one <table>.<generation>.bin per table.
+
+    Values keep their Python type (Decimal, datetime, date, timedelta, bytes, int, float, str).
+    Columns whose values have mixed or other types are stored as JSON. compression is None,
+    'zlib' or 'zstd' (needs the zstandard package) and is applied per column block.
+
+    Every write uses new data file names, and the manifest pointing at them replaces the old one
+    last, so a reader never sees tables that are still being written. The data files of the
+    previous manifest are kept for readers that loaded it, older ones are removed.
+    """
+    if compression == 'zstd' and zstandard is None:
+        raise ImportError("zstd compression needs the zstandard package")
+    os.makedirs(cache_dir, exist_ok=True)
+    try:
+        previous_files = {table['file'] for table in load_columnar_manifest(cache_dir)['tables'].values()}
+    except FileNotFoundError:
+        previous_files = set()
+
+    generation = f"{time.time_ns():x}"
+    manifest = {"version": FORMAT_VERSION, "compression": compression, "tables": {}}
+    for table_name, table_data in data_cache.items():
+        column_names = list(schema_cache[table_name]['columns'].keys()) \
+            if schema_cache and table_name in schema_cache else None
+        manifest['tables'][table_name] = write_columnar_table(cache_dir, table_name, table_data['data'],
+                                                              column_names, compression, generation)
+
+    part_file = os.path.join(cache_dir, MANIFEST_FILE + '.part')
+    with open(part_file, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(part_file, os.path.join(cache_dir, MANIFEST_FILE))
+
+    current_files = {table['file'] for table in manifest['tables'].values()}
+    for file_name in os.listdir(cache_dir):
+        if file_name.endswith('.bin') and file_name not in current_files | previous_files:
+            os.remove(os.path.join(cache_dir, file_name))
+    print(f"Columnar cache saved to {cache_dir}")
+    return manifest
+
+def load_columnar_manifest(cache_dir: str) -> Dict:
+    """Load the manifest of a columnar cache directory."""
+    with open(os.path.join(cache_dir, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def decode_column(block, column: Dict, rows: int) -> List:
+    """Decode a column block back into a list of Python values."""
+    view = memoryview(block)
+    nulls = [False] * rows
+    if column['nulls']:
+        nulls = [bool(flag) for flag in view[:rows]]
+        view = view[pad8(rows):]
+
+    col_type = column['type']
+    if col_type in FIXED_TYPES:
+        values = view[:rows * array(FIXED_TYPES[col_type]).itemsize].cast(FIXED_TYPES[col_type]).tolist()
+        if col_type == 'datetime':
+            convert = lambda val: DATETIME_ORIGIN + val * MICROSECOND
+        elif col_type == 'date':
+            convert = date.fromordinal
+        elif col_type == 'time':
+            convert = lambda val: val * MICROSECOND
+        elif col_type == 'bool':
+            convert = bool
+        else:
+            return [None if is_null else val for val, is_null in zip(values, nulls)]
+    else:
+        offsets = view[:(rows + 1) * 8].cast('Q').tolist()
+        data = bytes(view[(rows + 1) * 8:])
+        values = [data[offsets[i]:offsets[i + 1]] for i in range(rows)]
+        if col_type == 'bytes':
+            convert = bytes
+        elif col_type == 'decimal':
+            convert = lambda val: Decimal(val.decode('utf-8'))
+        elif col_type == 'json':
+            convert = lambda val: json.loads(val.decode('utf-8'))
+        else:
+            convert = lambda val: val.decode('utf-8')
+
+    return [None if is_null else convert(val) for val, is_null in zip(values, nulls)]
+
+def read_columns(cache_dir: str, table_name: str, column_names: List[str] = None, manifest: Dict = None) -> Dict[str, List]:
+    """Read some columns of one table, memory-mapping its file so other columns and tables are never read.
+
+    Returns {column: values} in table order, for all columns when column_names is None.
+    """
+    manifest = manifest or load_columnar_manifest(cache_dir)
+    table = manifest['tables'][table_name]
+    columns = [column for column in table['columns'] if column_names is None or column['name'] in column_names]
+    result = {}
+    if not table['rows'] or not columns:
+        return {column['name']: [None] * table['rows'] for column in columns}
+
+    with open(os.path.join(cache_dir, table['file']), 'rb') as f, \
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        for column in columns:
+            # Only the pages of the requested columns are read from disk
+            with memoryview(mapped) as view, view[column['offset']:column['offset'] + column['length']] as block:
+                raw = decompress_block(block, manifest['compression'], column['raw_length'])
+            result[column['name']] = decode_column(raw, column, table['rows'])
+    return result
+
+def iter_columnar_rows(cache_dir: str, table_name: str, column_names: List[str] = None, manifest: Dict = None):
+    """Yield the rows of one table as dicts, reading only the requested columns."""
+    columns = read_columns(cache_dir, table_name, column_names, manifest)
+    names = list(columns.keys())
+    for values in zip(*columns.values()):
+        yield dict(zip(names, values))
+
+def load_columnar_cache(cache_dir: str) -> Dict:
+    """Build a data cache over a columnar cache directory without reading any rows yet."""
+    try:
+        manifest = load_columnar_manifest(cache_dir)
+    except FileNotFoundError:
+        print(f"Columnar cache {cache_dir} not found")
+        return {}
+    return {table_name: {"data": iter_columnar_rows(cache_dir, table_name, manifest=manifest)}
+            for table_name in manifest['tables']}
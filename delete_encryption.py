@@ -1,24 +1,91 @@
 import os
+import re
+import mmap
+import shutil
+from concurrent.futures import ProcessPoolExecutor
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
+# Rewrite rules: name -> (pattern, replacement), applied to the raw bytes of each line
+REWRITE_RULES = {
+    "encryption": (rb"[ \t]*ENCRYPTION[ \t]*=[ \t]*'[YyNn]'", b""),
+    "definer": (rb"[ \t]*DEFINER[ \t]*=[ \t]*(?:`[^`]*`|'[^']*'|\w+)@(?:`[^`]*`|'[^']*'|[\w.%-]+)", b""),
+    "collate": (rb"[ \t]*(?:DEFAULT[ \t]+)?COLLATE[ \t]*=?[ \t]*\w+", b""),
+    "auto_increment": (rb"[ \t]*AUTO_INCREMENT[ \t]*=[ \t]*\d+", b""),  # The table option, not the column flag
+}
+DEFAULT_RULES = ["encryption"]
+# Data lines are left alone, so values that look like table options are never changed
+DATA_PREFIXES = (b"INSERT ", b"REPLACE ")
+
+def compile_rules(rule_names):
+    """Compile the named rules, plus one combined pattern used to pre-scan files."""
+    rules = [(re.compile(REWRITE_RULES[name][0], re.IGNORECASE), REWRITE_RULES[name][1]) for name in rule_names]
+    combined = re.compile(b"|".join(b"(?:" + REWRITE_RULES[name][0] + b")" for name in rule_names), re.IGNORECASE)
+    return rules, combined
+
+def rewrite_sql_file(file_path: str, rule_names):
+    """Apply the rules to one SQL file, line by line, and replace it atomically.
+
+    The file is first searched through a memory map; when nothing matches, or the only matches are
+    inside INSERT/REPLACE data lines, it is left untouched. Returns the number of replacements made.
+    """
+    rules, combined = compile_rules(rule_names)
+    if os.path.getsize(file_path) == 0:
+        return 0
+    with open(file_path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        if combined.search(mapped) is None:
+            return 0
+
+    replacements = 0
+    temp_path = file_path + '.tmp'
+    try:
+        with open(file_path, 'rb') as source, open(temp_path, 'wb') as target:
+            for line in source:
+                if not line.lstrip().upper().startswith(DATA_PREFIXES) and combined.search(line):
+                    for pattern, replacement in rules:
+                        line, count = pattern.subn(replacement, line)
+                        replacements += count
+                target.write(line)
+        if replacements:
+            shutil.copymode(file_path, temp_path)
+            os.replace(temp_path, file_path)  # Readers see either the old or the new file, never half of it
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return replacements
+
+def rewrite_sql_files(folder_path: str, rule_names=None, workers: int = None):
+    """Rewrite every .sql file of a folder with the named rules, several files at a time in separate processes.
+
+    Returns {filename: replacements}.
+    """
+    rule_names = rule_names or DEFAULT_RULES
+    unknown = [name for name in rule_names if name not in REWRITE_RULES]
+    if unknown:
+        raise ValueError(f"Unknown rewrite rules: {', '.join(unknown)}")
+
+    filenames = sorted(filename for filename in os.listdir(folder_path) if filename.endswith('.sql'))
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {filename: executor.submit(rewrite_sql_file, os.path.join(folder_path, filename), rule_names)
+                   for filename in filenames}
+        for filename, future in futures.items():
+            try:
+                results[filename] = future.result()
+            except OSError as e:
+                print(f"Error rewriting {filename}: {e}")
+                continue
+            if results[filename]:
+                print(f"Updated file: {filename} ({results[filename]} replacements)")
+    skipped = sum(1 for count in results.values() if count == 0)
+    print(f"{len(results) - skipped} files updated, {skipped} files without matches skipped")
+    return results
+
 def remove_encryption_flag(folder_path: str):
     """Scan SQL files in the specified folder and remove ENCRYPTION='Y'."""
-    # Iterate over all files in the specified folder
-    for filename in os.listdir(folder_path):
-        if filename.endswith('.sql'):  # Check if the file is an SQL file
-            file_path = os.path.join(folder_path, filename)
-            with open(file_path, 'r', encoding='utf-8') as file:
-                content = file.read()  # Read the content of the file
-            
-            # Remove occurrences of ENCRYPTION='Y'
-            updated_content = content.replace("ENCRYPTION='Y'", "")
-            
-            # Write the updated content back to the file
-            with open(file_path, 'w', encoding='utf-8') as file:
-                file.write(updated_content)
-            
-            print(f"Updated file: {filename}")
-
-# Example usage
-remove_encryption_flag(os.path.join(BASE_DIR, 'path/to/your/sql_directory'))
\ No newline at end of file
+    return rewrite_sql_files(folder_path, ["encryption"])
+
+if __name__ == "__main__":
+    # Example usage
+    rewrite_sql_files(os.path.join(BASE_DIR, 'path/to/your/sql_directory'),
+                      ["encryption"])  # Add "definer", "collate", "auto_increment" as needed
@@ -1,8 +1,22 @@
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Tuple
+import gzip
+import io
 import json
-from datetime import datetime
+from datetime import datetime, date, timedelta
+from decimal import Decimal
 import os
 import re
+import itertools
+
+try:
+    import zstandard
+except ImportError:  # zstd compression is optional
+    zstandard = None
+
+# Escapes for quoted string literals (the files never enable NO_BACKSLASH_ESCAPES)
+SQL_STRING_ESCAPES = str.maketrans({'\\': '\\\\', "'": "\\'", '\0': '\\0', '\n': '\\n', '\r': '\\r', '\x1a': '\\Z'})
+# Backslash escapes understood by LOAD DATA with the default ESCAPED BY '\\'
+TSV_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r', '\0': '\\0'})
 
 
 def load_cache_from_file(filename: str) -> Dict:
@@ -17,9 +31,178 @@ def load_cache_from_file(filename: str) -> Dict:
         print(f"Error loading cache: {e}")
         return {}
 
-def generate_sql_file(data_cache: dict, output_dir: str = '', db_name: str = ''): 
-    """Generate SQL INSERT statements from data cache."""
+def iter_table_rows(filename: str):
+    """Yield rows from a JSON Lines table file written by read_from_db.stream_table_data."""
+    with open(filename, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def iter_chunked_table_rows(cache_dir: str, manifest_file: str):
+    """Yield rows from the chunk files listed in a chunked table manifest, in primary key order."""
+    with open(manifest_file, 'r') as f:
+        manifest = json.load(f)
+    for chunk in manifest['chunks']:
+        yield from iter_table_rows(os.path.join(cache_dir, chunk['file']))
+
+def load_stream_cache(cache_dir: str) -> Dict:
+    """Build a data cache over a directory of <table>.jsonl files without reading any rows yet."""
+    data_cache = {}
+    try:
+        for filename in sorted(os.listdir(cache_dir)):
+            if filename.endswith('.manifest.json'):
+                # Chunked exports show up as a single logical table
+                table_name = filename[:-len('.manifest.json')]
+                data_cache[table_name] = {"data": iter_chunked_table_rows(cache_dir, os.path.join(cache_dir, filename))}
+            elif filename.endswith('.jsonl'):
+                table_name = filename[:-len('.jsonl')]
+                data_cache.setdefault(table_name, {"data": iter_table_rows(os.path.join(cache_dir, filename))})
+    except FileNotFoundError:
+        print(f"Cache directory {cache_dir} not found")
+    return data_cache
+
+def compressed_path(output_file: str, compression: str = None) -> str:
+    """Return the file name written for a compression: .gz for gzip, .zst for zstd."""
+    return output_file + {None: '', 'gzip': '.gz', 'zstd': '.zst'}[compression]
+
+def open_sql_output(output_file: str, compression: str = None):
+    """Open a text file for writing SQL, compressing it on the fly with gzip or zstd."""
+    if compression == 'gzip':
+        return gzip.open(output_file, 'wt', encoding='utf-8', compresslevel=6)
+    if compression == 'zstd':
+        if zstandard is None:
+            raise ImportError("zstd compression needs the zstandard package")
+        writer = zstandard.ZstdCompressor(level=3).stream_writer(open(output_file, 'wb'), closefd=True)
+        return io.TextIOWrapper(writer, encoding='utf-8')
+    return open(output_file, 'w', encoding='utf-8')
+
+def quote_sql_string(val: str) -> str:
+    """Quote a string as a MySQL literal, escaping backslashes, quotes and control characters."""
+    return "'" + val.translate(SQL_STRING_ESCAPES) + "'"
+
+def format_time_value(val: timedelta) -> str:
+    """Format a TIME value, which the connector returns as a timedelta, as [-]HH:MM:SS[.ffffff]."""
+    microseconds = val // timedelta(microseconds=1)
+    sign = '-' if microseconds < 0 else ''
+    seconds, fraction = divmod(abs(microseconds), 1000000)
+    hours, rest = divmod(seconds, 3600)
+    return f"{sign}{hours:02d}:{rest // 60:02d}:{rest % 60:02d}" + (f".{fraction:06d}" if fraction else '')
+
+def format_sql_time(val: timedelta) -> str:
+    """Format a TIME value as a quoted literal."""
+    return f"'{format_time_value(val)}'"
+
+def encode_sql_value(val) -> str:
+    """Encode any value as a SQL literal from its Python type."""
+    if val is None:
+        return 'NULL'
+    if isinstance(val, bool):  # Must come before int, bool is a subclass of int
+        return '1' if val else '0'
+    if isinstance(val, (int, float, Decimal)):
+        return str(val)
+    if isinstance(val, (datetime, date, timedelta)):
+        return encode_sql_temporal(val)
+    if isinstance(val, (bytes, bytearray)):
+        return encode_sql_binary(val)
+    return quote_sql_string(str(val))
+
+def encode_sql_int(val) -> str:
+    """Encode an integer, BIT or YEAR column value."""
+    if val is None:
+        return 'NULL'
+    if isinstance(val, (bytes, bytearray)):  # BIT columns come back as bytes
+        return str(int.from_bytes(val, 'big'))
+    return str(int(val))
+
+def encode_sql_float(val) -> str:
+    """Encode a FLOAT or DOUBLE column value."""
+    return 'NULL' if val is None else repr(float(val))
+
+def encode_sql_decimal(val) -> str:
+    """Encode a DECIMAL column value without losing digits."""
+    if val is None:
+        return 'NULL'
+    # Going through str keeps the digits of values that were floats or strings in the cache
+    return str(val if isinstance(val, Decimal) else Decimal(str(val)))
+
+def encode_sql_temporal(val) -> str:
+    """Encode a DATE, DATETIME, TIMESTAMP or TIME column value."""
+    if val is None:
+        return 'NULL'
+    if isinstance(val, datetime):
+        return "'" + val.isoformat(sep=' ') + "'"
+    if isinstance(val, date):
+        return "'" + val.isoformat() + "'"
+    if isinstance(val, timedelta):
+        return format_sql_time(val)
+    return quote_sql_string(str(val))
+
+def encode_sql_binary(val) -> str:
+    """Encode a binary or BLOB column value as a hex literal."""
+    if val is None:
+        return 'NULL'
+    if isinstance(val, str):
+        val = val.encode('utf-8')
+    return "X'" + bytes(val).hex() + "'" if val else "''"
+
+def encode_sql_text(val) -> str:
+    """Encode a text column value as an escaped string literal."""
+    if val is None:
+        return 'NULL'
+    if isinstance(val, (bytes, bytearray)):
+        val = bytes(val).decode('utf-8', 'replace')
+    return quote_sql_string(str(val))
+
+def build_column_encoders(columns: Dict[str, str]) -> Dict[str, Any]:
+    """Pick one encoder per column from the column types of a schema cache entry."""
+    encoders = {}
+    for col, definition in columns.items():
+        base_type = definition.split()[0].split('(')[0].lower() if definition else ''
+        if base_type in ('tinyint', 'smallint', 'mediumint', 'int', 'integer', 'bigint', 'bit', 'year'):
+            encoders[col] = encode_sql_int
+        elif base_type in ('float', 'double', 'real'):
+            encoders[col] = encode_sql_float
+        elif base_type in ('decimal', 'numeric'):
+            encoders[col] = encode_sql_decimal
+        elif base_type in ('date', 'datetime', 'timestamp', 'time'):
+            encoders[col] = encode_sql_temporal
+        elif base_type in ('binary', 'varbinary', 'tinyblob', 'blob', 'mediumblob', 'longblob'):
+            encoders[col] = encode_sql_binary
+        elif base_type in ('char', 'varchar', 'tinytext', 'text', 'mediumtext', 'longtext', 'enum', 'set', 'json'):
+            encoders[col] = encode_sql_text
+        else:
+            encoders[col] = encode_sql_value
+    return encoders
+
+def build_insert_clauses(table_name: str, column_names: List[str], on_duplicate: str = None) -> Tuple[str, str]:
+    """Build the text that goes before and after the VALUES tuples of an INSERT for one column set."""
+    columns = ', '.join(f'`{col}`' for col in column_names)
+    if on_duplicate == 'ignore':
+        return f"INSERT IGNORE INTO `{table_name}` ({columns}) VALUES ", ";\n"
+    if on_duplicate == 'update':
+        updates = ', '.join(f'`{col}` = VALUES(`{col}`)' for col in column_names)
+        return f"INSERT INTO `{table_name}` ({columns}) VALUES ", f" ON DUPLICATE KEY UPDATE {updates};\n"
+    return f"INSERT INTO `{table_name}` ({columns}) VALUES ", ";\n"
+
+def generate_sql_file(data_cache: dict, output_dir: str = '', db_name: str = '', rows_per_insert: int = 1,
+                      max_statement_bytes: int = 1024 * 1024, on_duplicate: str = None, schema_cache: Dict = None,
+                      compression: str = None, renumber_ids: bool = True): 
+    """Generate SQL INSERT statements from data cache.
+
+    Values are encoded by one encoder per column, chosen from the column types in schema_cache
+    when it is given; columns it does not describe are encoded from the Python type of each value.
+
+    With rows_per_insert > 1, consecutive rows that share the same columns are written as one
+    extended INSERT, closed at rows_per_insert rows or once it would exceed max_statement_bytes
+    (keep it below the target's max_allowed_packet). on_duplicate='ignore' writes INSERT IGNORE
+    and on_duplicate='update' adds ON DUPLICATE KEY UPDATE for every column.
+
+    compression='gzip' or 'zstd' writes <table>.sql.gz or <table>.sql.zst, compressed as it is written.
+    renumber_ids=False keeps the cached `id` values instead of numbering rows from 1, which
+    foreign keys between the exported tables need.
+    """
     os.makedirs(output_dir, exist_ok=True)  # Create output directory if it doesn't exist
+    schema_cache = schema_cache or {}
 
     # Process each table in the data cache
     for table_name, table_info in data_cache.items():
@@ -27,8 +210,8 @@ def generate_sql_file(data_cache: dict, output_dir: str = '', db_name: str = '')
         if not table_data:  # Skip if no data
             continue
         
-        output_file = os.path.join(output_dir, f"{table_name}.sql")
-        with open(output_file, 'w', encoding='utf-8') as f:
+        output_file = compressed_path(os.path.join(output_dir, f"{table_name}.sql"), compression)
+        with open_sql_output(output_file, compression) as f:
             # Write header
             f.write("-- SQL INSERT statements generated from cache\n")
             f.write("-- Generated at: " + datetime.now().strftime("%Y-%m-%d %H:%M:%S") + "\n\n")
@@ -43,44 +226,121 @@ def generate_sql_file(data_cache: dict, output_dir: str = '', db_name: str = '')
             # Write table header
             f.write(f"-- Data for table `{table_name}`\n")
             
+            # Rows waiting to be written as one INSERT, and the clauses of their column set
+            batch = []
+            batch_bytes = 0
+            batch_columns = None
+            prefix, suffix = '', ''
+            clauses_cache = {}  # Column set -> INSERT clauses and value encoders, built once per column set
+            column_encoders = build_column_encoders(schema_cache.get(table_name, {}).get('columns', {}))
+
             # Write INSERT statements
             for index, row in enumerate(table_data, start=1):  # Start ID from 1
                 # Check if the row has valid data before writing
                 if not any(row.values()):  # Skip empty rows
                     continue
                 
-                # Create the column names part
-                columns = ', '.join(f'`{col}`' for col in row.keys())
-                
-                # Create the values part, handling different data types
-                values = []
-                for val in row.values():
-                    if val is None:
-                        values.append('NULL')
-                    elif isinstance(val, (int, float)):
-                        values.append(str(val))
-                    elif isinstance(val, bool):
-                        values.append('1' if val else '0')
-                    else:
-                        # Escape single quotes and wrap in quotes
-                        val_str = str(val).replace("'", "''")  # Escape single quotes
-                        values.append(f"'{val_str}'")
+                # Encode the values with the encoders of this column set
+                columns = tuple(row.keys())
+                if columns not in clauses_cache:
+                    clauses_cache[columns] = build_insert_clauses(table_name, columns, on_duplicate) + (
+                        [column_encoders.get(col, encode_sql_value) for col in columns],)
+                values = [encode(val) for encode, val in zip(clauses_cache[columns][2], row.values())]
                 
                 # Set the ID to the current index (starting from 1)
-                if 'id' in row:
+                if renumber_ids and 'id' in row:
                     values[0] = str(index)  # Assuming 'id' is the first column
                 
-                values_str = ', '.join(values)
-                
-                # Write the INSERT statement on a single line
-                insert_sql = f"INSERT INTO `{table_name}` ({columns}) VALUES ({values_str});\n"
-                f.write(insert_sql)
+                values_str = f"({', '.join(values)})"
+                values_bytes = len(values_str) if values_str.isascii() else len(values_str.encode('utf-8'))
+
+                # Close the current INSERT when the columns change or a limit would be crossed
+                if batch and (columns != batch_columns or len(batch) >= rows_per_insert
+                              or batch_bytes + values_bytes + 1 > max_statement_bytes):
+                    f.write(prefix + ','.join(batch) + suffix)
+                    batch, batch_bytes = [], 0
+
+                if not batch:
+                    batch_columns = columns
+                    prefix, suffix = clauses_cache[columns][:2]
+                    batch_bytes = len(prefix.encode('utf-8')) + len(suffix.encode('utf-8'))
+
+                batch.append(values_str)
+                batch_bytes += values_bytes + 1
+
+            if batch:
+                f.write(prefix + ','.join(batch) + suffix)
             
             f.write("\n")  # Add newline at the end of the file
         
         print(f"SQL INSERT statements generated successfully for table `{table_name}`: {output_file}")
 
 
+def encode_tsv_value(val) -> str:
+    """Encode one value as a LOAD DATA field: \\N for NULL, backslash escapes for special characters."""
+    if val is None:
+        return '\\N'
+    if isinstance(val, bool):
+        return '1' if val else '0'
+    if isinstance(val, (int, float)):
+        return str(val)
+    if isinstance(val, datetime):
+        return val.isoformat(sep=' ')
+    if isinstance(val, timedelta):  # str() would give '-1 day, 23:30:00'
+        return format_time_value(val)
+    if isinstance(val, (bytes, bytearray)):
+        # Raw bytes survive the line's utf-8 encoding untouched thanks to surrogateescape
+        val = bytes(val).decode('utf-8', 'surrogateescape')
+    return str(val).translate(TSV_ESCAPES)
+
+def generate_load_data_files(data_cache: dict, output_dir: str = '', db_name: str = '', renumber_ids: bool = True):
+    """Write each table as <table>.tsv plus a <table>.load.sql loader script using LOAD DATA LOCAL INFILE.
+
+    renumber_ids works as in generate_sql_file.
+    """
+    os.makedirs(output_dir, exist_ok=True)  # Create output directory if it doesn't exist
+
+    for table_name, table_info in data_cache.items():
+        table_data = iter(table_info['data'])
+        first_row = next(table_data, None)
+        if first_row is None:  # Skip if no data
+            continue
+
+        # The first row fixes the column order of the file; missing columns are loaded as NULL
+        column_names = list(first_row.keys())
+        data_file = os.path.join(output_dir, f"{table_name}.tsv")
+        rows = 0
+        with open(data_file, 'wb') as f:
+            for index, row in enumerate(itertools.chain([first_row], table_data), start=1):  # Start ID from 1
+                # Skip empty rows, like generate_sql_file
+                if not any(row.values()):
+                    continue
+                values = [encode_tsv_value(row.get(col)) for col in column_names]
+
+                # Set the ID to the current index (starting from 1), like generate_sql_file
+                if renumber_ids and 'id' in row:
+                    values[column_names.index('id')] = str(index)
+
+                f.write(('\t'.join(values) + '\n').encode('utf-8', 'surrogateescape'))
+                rows += 1
+
+        columns = ', '.join(f'`{col}`' for col in column_names)
+        loader_file = os.path.join(output_dir, f"{table_name}.load.sql")
+        with open(loader_file, 'w', encoding='utf-8') as f:
+            f.write("-- LOAD DATA script generated from cache\n")
+            f.write("-- Generated at: " + datetime.now().strftime("%Y-%m-%d %H:%M:%S") + "\n")
+            f.write("-- The INFILE path is relative to this script, run it with sql_insert.py\n\n")
+            f.write("SET SQL_MODE = 'NO_AUTO_VALUE_ON_ZERO';\n")
+            f.write("SET NAMES utf8mb4;\n\n")
+            f.write(f"USE `{db_name}`;\n\n")
+            # binary: the file's bytes go into each column as they are, text is utf-8 already and
+            # BLOB values must not be validated or converted as utf8mb4
+            f.write(f"LOAD DATA LOCAL INFILE '{table_name}.tsv' INTO TABLE `{table_name}` CHARACTER SET binary "
+                    f"FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\' LINES TERMINATED BY '\\n' ({columns});\n")
+
+        print(f"LOAD DATA files generated successfully for table `{table_name}` ({rows} rows): {loader_file}")
+
+
 # def generate_sql_file(data_cache: dict, output_file: str = '', db_name: str = ''):
 #     """Generate SQL INSERT statements from data cache."""
 #     with open(output_file, 'w', encoding='utf-8') as f:
@@ -185,9 +445,9 @@ def generate_create_table_sql(schema_file: str, db_name: str) -> List[str]:
     return create_statements
 
 
-def write_sql_to_file(sql_statements: List[str], output_file: str) -> None:
-    """Write SQL statements to a specified SQL file."""
-    with open(output_file, 'w', encoding='utf-8') as f:
+def write_sql_to_file(sql_statements: List[str], output_file: str, compression: str = None) -> None:
+    """Write SQL statements to a specified SQL file, with compression='gzip' or 'zstd' to <file>.gz / <file>.zst."""
+    with open_sql_output(compressed_path(output_file, compression), compression) as f:
         for statement in sql_statements:
             # Escape single quotes in the SQL statement
             f.write(statement + "\n")  # Write each statement followed by a newline
@@ -206,6 +466,9 @@ if __name__ == "__main__":
     # Load cached data
     schema_cache = load_cache_from_file(schema_cache_path)
     # data_cache = load_cache_from_file(data_cache_path)
+    # data_cache = load_stream_cache(os.path.join(current_dir, 'cache'))  # Streamed <table>.jsonl files
+    # from columnar_cache import load_columnar_cache  # Typed columnar cache
+    # data_cache = load_columnar_cache(os.path.join(current_dir, 'cache', 'columnar'))
     
     # Define the output directory
     output_dir = os.path.join(current_dir, 'sql')
@@ -216,5 +479,12 @@ if __name__ == "__main__":
 
     # Generate the SQL file with INSERT statements
     # generate_sql_file(data_cache, output_dir)
+    # generate_sql_file(data_cache, output_dir, db_name, rows_per_insert=1000)  # Extended INSERTs, 1000 rows each
+    # generate_sql_file(data_cache, output_dir, db_name, schema_cache=schema_cache)  # Encode values by column type
+    # generate_sql_file(data_cache, output_dir, db_name, rows_per_insert=1000, compression='gzip')  # <table>.sql.gz
+    # generate_load_data_files(data_cache, output_dir, db_name)  # <table>.tsv + <table>.load.sql for bulk loading
+    # # Subset exports (read_from_db.export_subset) must keep their ids so foreign keys still match
+    # generate_sql_file(load_cache_from_file(os.path.join(current_dir, 'cache', 'subset_data_cache.json')),
+    #                   os.path.join(current_dir, 'sql_for_test'), db_name, rows_per_insert=1000, renumber_ids=False)
 
     # generate_sql_file(data_cache, os.path.join(current_dir, 'sql_to_be_imported/staging/database_dump.sql'), db_name='db_name')
\ No newline at end of file
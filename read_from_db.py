@@ -1,8 +1,21 @@
 import mysql.connector
 from typing import Dict, List, Any
 import json
-from datetime import datetime
+import hashlib
+import heapq
+import itertools
+import fnmatch
+from datetime import datetime, date
 import os
+import queue
+import tempfile
+from decimal import Decimal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+INTEGER_TYPES = ('tinyint', 'smallint', 'mediumint', 'int', 'bigint')
+WATERMARK_COLUMNS = ('updated_at', 'updatedAt')  # Row modification timestamps, snake_case and Prisma style
 
 def create_connection(host, user, password, database):
     """Establish a database connection."""
@@ -52,6 +65,28 @@ def retrieve_data(connection):
     finally:
         cursor.close()
 
+def format_column_definition(data_type, column_default, is_nullable, column_key, extra, char_length) -> str:
+    """Build the column definition string stored in the schema cache from INFORMATION_SCHEMA.COLUMNS fields."""
+    # Construct the data type string
+    if char_length is not None:
+        data_type = f"{data_type}({char_length})"
+
+    # Add NOT NULL information
+    if is_nullable == 'NO':
+        data_type += " NOT NULL"
+
+    # Add default value information
+    if column_default is not None:
+        data_type += f" DEFAULT '{column_default}'"
+
+    # Add primary key and auto-increment information
+    if column_key == 'PRI':
+        data_type += " PRIMARY KEY"  # Change to PRIMARY KEY
+    if 'auto_increment' in extra:
+        data_type += " AUTO_INCREMENT"  # Change to AUTO_INCREMENT
+
+    return data_type
+
 def get_column_types(cursor, table_name: str) -> Dict[str, str]:
     """Get column names and their types for a table, including lengths for VARCHAR, default values, NOT NULL, AI, and Pri."""
     cursor.execute(f"""
@@ -70,49 +105,248 @@ def get_column_types(cursor, table_name: str) -> Dict[str, str]:
     
     column_types = {}
     for col_name, data_type, column_default, is_nullable, column_key, extra, char_length in cursor.fetchall():
-        # Construct the data type string
-        if char_length is not None:
-            data_type = f"{data_type}({char_length})"
-        
-        # Add NOT NULL information
-        if is_nullable == 'NO':
-            data_type += " NOT NULL"
-        
-        # Add default value information
-        if column_default is not None:
-            data_type += f" DEFAULT '{column_default}'"
-        
-        # Add primary key and auto-increment information
-        if column_key == 'PRI':
-            data_type += " PRIMARY KEY"  # Change to PRIMARY KEY
-        if 'auto_increment' in extra:
-            data_type += " AUTO_INCREMENT"  # Change to AUTO_INCREMENT
-        
-        column_types[col_name] = data_type
+        column_types[col_name] = format_column_definition(data_type, column_default, is_nullable, column_key,
+                                                          extra, char_length)
     
     return column_types
 
-def cache_database_schema(connection) -> Dict[str, Dict]:
-    """Cache the database schema including table names, column names, and types."""
+def introspect_database(cursor, table_names: List[str] = None) -> Dict[str, Dict]:
+    """Read columns, indexes, foreign keys and table options of the whole database in one query each.
+
+    Every query is ordered by table so the result is built in a single pass, instead of one
+    INFORMATION_SCHEMA round-trip per table. Pass table_names to restrict it to those tables.
+    """
+    def table_filter(prefix: str = '') -> str:
+        if table_names is None:
+            return ''
+        return f"AND {prefix}TABLE_NAME IN ({', '.join(['%s'] * len(table_names))})"
+
+    params = tuple(table_names or ())
+
+    tables = {}
+    cursor.execute(f"""
+        SELECT TABLE_NAME, TABLE_TYPE, ENGINE, ROW_FORMAT, TABLE_COLLATION, CREATE_OPTIONS
+        FROM INFORMATION_SCHEMA.TABLES
+        WHERE TABLE_SCHEMA = DATABASE() {table_filter()}
+        ORDER BY TABLE_NAME
+    """, params)
+    for table_name, table_type, engine, row_format, collation, create_options in cursor.fetchall():
+        tables[table_name] = {
+            "columns": {},
+            "indexes": {},
+            "foreign_keys": {},
+            "options": {
+                "table_type": table_type,
+                "engine": engine,
+                "row_format": row_format,
+                "collation": collation,
+                "create_options": create_options
+            }
+        }
+
+    cursor.execute(f"""
+        SELECT TABLE_NAME, COLUMN_NAME, DATA_TYPE, COLUMN_DEFAULT, IS_NULLABLE, COLUMN_KEY, EXTRA,
+               CHARACTER_MAXIMUM_LENGTH
+        FROM INFORMATION_SCHEMA.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() {table_filter()}
+        ORDER BY TABLE_NAME, ORDINAL_POSITION
+    """, params)
+    for table_name, col_name, data_type, column_default, is_nullable, column_key, extra, char_length in cursor.fetchall():
+        if table_name in tables:
+            tables[table_name]['columns'][col_name] = format_column_definition(
+                data_type, column_default, is_nullable, column_key, extra, char_length)
+
+    cursor.execute(f"""
+        SELECT TABLE_NAME, INDEX_NAME, NON_UNIQUE, COLUMN_NAME, SUB_PART, INDEX_TYPE
+        FROM INFORMATION_SCHEMA.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() {table_filter()}
+        ORDER BY TABLE_NAME, INDEX_NAME, SEQ_IN_INDEX
+    """, params)
+    for table_name, index_name, non_unique, col_name, sub_part, index_type in cursor.fetchall():
+        if table_name not in tables or col_name is None:  # Skip functional key parts
+            continue
+        index = tables[table_name]['indexes'].setdefault(index_name, {
+            "columns": [],
+            "unique": not int(non_unique),
+            "type": index_type
+        })
+        index['columns'].append(f"{col_name}({sub_part})" if sub_part else col_name)
+
+    cursor.execute(f"""
+        SELECT k.TABLE_NAME, k.CONSTRAINT_NAME, k.COLUMN_NAME, k.REFERENCED_TABLE_NAME, k.REFERENCED_COLUMN_NAME,
+               r.UPDATE_RULE, r.DELETE_RULE
+        FROM INFORMATION_SCHEMA.KEY_COLUMN_USAGE k
+        JOIN INFORMATION_SCHEMA.REFERENTIAL_CONSTRAINTS r
+          ON r.CONSTRAINT_SCHEMA = k.CONSTRAINT_SCHEMA
+         AND r.TABLE_NAME = k.TABLE_NAME
+         AND r.CONSTRAINT_NAME = k.CONSTRAINT_NAME
+        WHERE k.TABLE_SCHEMA = DATABASE()
+          AND k.REFERENCED_TABLE_NAME IS NOT NULL {table_filter('k.')}
+        ORDER BY k.TABLE_NAME, k.CONSTRAINT_NAME, k.ORDINAL_POSITION
+    """, params)
+    for table_name, fk_name, col_name, ref_table, ref_col, update_rule, delete_rule in cursor.fetchall():
+        if table_name not in tables:
+            continue
+        foreign_key = tables[table_name]['foreign_keys'].setdefault(fk_name, {
+            "columns": [],
+            "referenced_table": ref_table,
+            "referenced_columns": [],
+            "on_update": update_rule,
+            "on_delete": delete_rule
+        })
+        foreign_key['columns'].append(col_name)
+        foreign_key['referenced_columns'].append(ref_col)
+
+    return tables
+
+def get_table_fingerprints(cursor) -> Dict[str, str]:
+    """Compute a fingerprint per table from its column definitions, indexes, foreign keys and CREATE_TIME/UPDATE_TIME.
+
+    The definitions are hashed on the server, so only one short signature per table crosses the wire.
+    """
+    # GROUP_CONCAT is cut at 1 KB by default, which would hide changes in wide tables
+    cursor.execute("SET SESSION group_concat_max_len = 16777216")
+
+    cursor.execute("""
+        SELECT TABLE_NAME, CREATE_TIME, UPDATE_TIME, ENGINE, ROW_FORMAT, TABLE_COLLATION, CREATE_OPTIONS
+        FROM INFORMATION_SCHEMA.TABLES
+        WHERE TABLE_SCHEMA = DATABASE()
+        ORDER BY TABLE_NAME
+    """)
+    signatures = {row[0]: [str(value) for value in row[1:]] for row in cursor.fetchall()}
+
+    cursor.execute("""
+        SELECT TABLE_NAME,
+               MD5(GROUP_CONCAT(CONCAT_WS('|', COLUMN_NAME, COLUMN_TYPE, IS_NULLABLE, IFNULL(COLUMN_DEFAULT, 'NULL'),
+                                          COLUMN_KEY, EXTRA)
+                                ORDER BY ORDINAL_POSITION SEPARATOR ';'))
+        FROM INFORMATION_SCHEMA.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE()
+        GROUP BY TABLE_NAME
+    """)
+    for table_name, column_signature in cursor.fetchall():
+        if table_name in signatures:
+            signatures[table_name].append(column_signature)
+
+    cursor.execute("""
+        SELECT TABLE_NAME,
+               MD5(GROUP_CONCAT(CONCAT_WS('|', INDEX_NAME, SEQ_IN_INDEX, NON_UNIQUE, IFNULL(COLUMN_NAME, ''),
+                                          IFNULL(SUB_PART, ''), INDEX_TYPE)
+                                ORDER BY INDEX_NAME, SEQ_IN_INDEX SEPARATOR ';'))
+        FROM INFORMATION_SCHEMA.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE()
+        GROUP BY TABLE_NAME
+    """)
+    for table_name, index_signature in cursor.fetchall():
+        if table_name in signatures:
+            signatures[table_name].append(index_signature)
+
+    cursor.execute("""
+        SELECT k.TABLE_NAME,
+               MD5(GROUP_CONCAT(CONCAT_WS('|', k.CONSTRAINT_NAME, k.ORDINAL_POSITION, k.COLUMN_NAME,
+                                          k.REFERENCED_TABLE_NAME, k.REFERENCED_COLUMN_NAME, r.UPDATE_RULE, r.DELETE_RULE)
+                                ORDER BY k.CONSTRAINT_NAME, k.ORDINAL_POSITION SEPARATOR ';'))
+        FROM INFORMATION_SCHEMA.KEY_COLUMN_USAGE k
+        JOIN INFORMATION_SCHEMA.REFERENTIAL_CONSTRAINTS r
+          ON r.CONSTRAINT_SCHEMA = k.CONSTRAINT_SCHEMA
+         AND r.TABLE_NAME = k.TABLE_NAME
+         AND r.CONSTRAINT_NAME = k.CONSTRAINT_NAME
+        WHERE k.TABLE_SCHEMA = DATABASE() AND k.REFERENCED_TABLE_NAME IS NOT NULL
+        GROUP BY k.TABLE_NAME
+    """)
+    for table_name, foreign_key_signature in cursor.fetchall():
+        if table_name in signatures:
+            signatures[table_name].append(foreign_key_signature)
+
+    return {table_name: hashlib.sha256('|'.join(parts).encode('utf-8')).hexdigest()
+            for table_name, parts in signatures.items()}
+
+def normalize_column_types(column_types: Dict[str, str]) -> Dict[str, str]:
+    """Apply the schema cache type rewrites to a table's column definitions."""
+    # Update mediumtext(16777215) to text(65535)
+    for col_name, data_type in column_types.items():
+        if data_type == "mediumtext(16777215)":
+            column_types[col_name] = "text(65535)"  # Change to text(65535)
+    return column_types
+
+def matches_any(name: str, patterns: List[str]) -> bool:
+    """Check a table or column name against a list of glob patterns."""
+    return any(fnmatch.fnmatchcase(name, pattern) for pattern in patterns)
+
+def select_table_names(cursor, export_filter: Dict) -> List[str]:
+    """List the base tables of the database that pass the include/exclude globs of an export filter.
+
+    An export filter looks like:
+        {
+            "include": ["*"],                                 # Table globs to export
+            "exclude": ["_prisma_migrations", "_Owner*"],     # Table globs to skip
+            "columns": {"users": ["id", "email"]},            # Table glob -> only these columns
+            "exclude_columns": {"*": ["password*"]},          # Table glob -> column globs to skip
+            "where": {"orders": "created_at >= '2024-01-01'"}  # Table -> row predicate
+        }
+    """
+    cursor.execute("""
+        SELECT TABLE_NAME FROM INFORMATION_SCHEMA.TABLES
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_TYPE = 'BASE TABLE'
+        ORDER BY TABLE_NAME
+    """)
+    return [table_name for (table_name,) in cursor.fetchall()
+            if matches_any(table_name, export_filter.get('include', ['*']))
+            and not matches_any(table_name, export_filter.get('exclude', []))]
+
+def filter_columns(table_name: str, columns: Dict[str, str], export_filter: Dict) -> Dict[str, str]:
+    """Keep the columns of a table that the export filter selects, in table order."""
+    included = [column for pattern, column_list in export_filter.get('columns', {}).items()
+                if fnmatch.fnmatchcase(table_name, pattern) for column in column_list]
+    excluded = [column for pattern, column_list in export_filter.get('exclude_columns', {}).items()
+                if fnmatch.fnmatchcase(table_name, pattern) for column in column_list]
+    return {col_name: definition for col_name, definition in columns.items()
+            if (not included or col_name in included) and not matches_any(col_name, excluded)}
+
+def apply_export_filter(table_name: str, entry: Dict, export_filter: Dict) -> Dict:
+    """Narrow a schema cache entry to the filtered columns and attach the table's row predicate, if any."""
+    if export_filter:
+        entry['columns'] = filter_columns(table_name, entry['columns'], export_filter)
+        if table_name in export_filter.get('where', {}):
+            entry['where'] = export_filter['where'][table_name]
+    return entry
+
+def where_clause(table_info: Dict, conditions: List[str] = ()) -> str:
+    """Build the WHERE clause of an export SELECT from the table's filter predicate and extra conditions."""
+    conditions = list(conditions)
+    if table_info.get('where'):
+        conditions.insert(0, f"({table_info['where']})")
+    return f" WHERE {' AND '.join(conditions)}" if conditions else ''
+
+def secondary_indexes(indexes: Dict[str, Dict]) -> Dict[str, Dict]:
+    """Drop the PRIMARY index, the primary key is already part of the column definitions."""
+    return {index_name: index for index_name, index in indexes.items() if index_name != 'PRIMARY'}
+
+def table_options(options: Dict[str, str]) -> Dict[str, str]:
+    """Keep the table options that a schema diff can reproduce."""
+    return {"engine": options['engine'], "row_format": options['row_format']}
+
+def cache_database_schema(connection, export_filter: Dict = None) -> Dict[str, Dict]:
+    """Cache the database schema including table names, column names, and types.
+
+    With an export_filter (see select_table_names), excluded tables are never introspected, the
+    columns are narrowed and the row predicates are kept so the export functions only read what is selected.
+    """
     schema_cache = {}
     try:
         cursor = connection.cursor()
-        cursor.execute("SHOW TABLES")
-        tables = cursor.fetchall()
+        table_names = select_table_names(cursor, export_filter) if export_filter else None
+        tables = introspect_database(cursor, table_names) if table_names != [] else {}
 
-        for (table_name,) in tables:
-            # Get column types for each table in the correct order
-            column_types = get_column_types(cursor, table_name)
-            
-            # Update mediumtext(16777215) to text(65535)
-            for col_name, data_type in column_types.items():
-                if data_type == "mediumtext(16777215)":
-                    column_types[col_name] = "text(65535)"  # Change to text(65535)
-
-            schema_cache[table_name] = {
-                "columns": column_types,
+        for table_name, table_info in tables.items():
+            # Columns come back in the correct order for each table
+            schema_cache[table_name] = apply_export_filter(table_name, {
+                "columns": normalize_column_types(table_info['columns']),
+                "indexes": secondary_indexes(table_info['indexes']),
+                "foreign_keys": table_info['foreign_keys'],
+                "options": table_options(table_info['options']),
                 "last_updated": datetime.now().isoformat()
-            }
+            }, export_filter)
 
     except mysql.connector.Error as err:
         print(f"Error caching schema: {err}")
@@ -121,6 +355,49 @@ def cache_database_schema(connection) -> Dict[str, Dict]:
     
     return schema_cache
 
+def cache_database_schema_incremental(connection, previous_schema: Dict, export_filter: Dict = None) -> Dict[str, Dict]:
+    """Refresh a schema snapshot, re-reading only the tables whose fingerprint changed since previous_schema.
+
+    Unchanged tables are copied from the previous snapshot as they are, including last_updated,
+    so a refresh with no schema changes produces an identical file. export_filter works as in
+    cache_database_schema; change it together with a full refresh.
+    """
+    schema_cache = {}
+    try:
+        cursor = connection.cursor()
+        fingerprints = get_table_fingerprints(cursor)
+        if export_filter:
+            selected = set(select_table_names(cursor, export_filter))
+            fingerprints = {table_name: fingerprint for table_name, fingerprint in fingerprints.items()
+                            if table_name in selected}
+        changed = [table_name for table_name, fingerprint in fingerprints.items()
+                   if previous_schema.get(table_name, {}).get('fingerprint') != fingerprint]
+        tables = introspect_database(cursor, changed) if changed else {}
+
+        for table_name, fingerprint in fingerprints.items():
+            if table_name in tables:
+                schema_cache[table_name] = apply_export_filter(table_name, {
+                    "columns": normalize_column_types(tables[table_name]['columns']),
+                    "indexes": secondary_indexes(tables[table_name]['indexes']),
+                    "foreign_keys": tables[table_name]['foreign_keys'],
+                    "options": table_options(tables[table_name]['options']),
+                    "last_updated": datetime.now().isoformat(),
+                    "fingerprint": fingerprint
+                }, export_filter)
+            elif table_name in previous_schema:
+                schema_cache[table_name] = previous_schema[table_name]
+
+        removed = [table_name for table_name in previous_schema if table_name not in fingerprints]
+        print(f"Schema refresh: {len(changed)} changed, {len(fingerprints) - len(changed)} unchanged, "
+              f"{len(removed)} removed")
+
+    except mysql.connector.Error as err:
+        print(f"Error caching schema: {err}")
+    finally:
+        cursor.close()
+
+    return schema_cache
+
 def cache_table_data(connection, schema_cache: Dict) -> Dict[str, List[Dict]]:
     """Cache the data from all tables."""
     data_cache = {}
@@ -132,8 +409,8 @@ def cache_table_data(connection, schema_cache: Dict) -> Dict[str, List[Dict]]:
             # Get the column names in the correct order
             column_names = list(schema_cache[table_name]['columns'].keys())
             # Create a SELECT statement with the columns in the desired order
-            column_list = ', '.join(column_names)
-            cursor.execute(f"SELECT {column_list} FROM {table_name}")
+            column_list = ', '.join(f"`{col}`" for col in column_names)
+            cursor.execute(f"SELECT {column_list} FROM `{table_name}`{where_clause(schema_cache[table_name])}")
             data_cache[table_name] = {
                 "data": cursor.fetchall(),
                 "last_updated": datetime.now().isoformat()
@@ -146,6 +423,678 @@ def cache_table_data(connection, schema_cache: Dict) -> Dict[str, List[Dict]]:
     
     return data_cache
 
+def export_table_to_file(cursor, table_name: str, column_names: List[str], output_file: str,
+                         batch_size: int = 10000, where: str = None) -> Dict[str, int]:
+    """Stream one table into a JSON Lines file, one row per line, in fetchmany batches."""
+    column_list = ', '.join(f"`{col}`" for col in column_names)
+    cursor.execute(f"SELECT {column_list} FROM `{table_name}`{where_clause({'where': where})}")
+
+    rows = 0
+    with open(output_file, 'w', encoding='utf-8') as f:
+        while True:
+            batch = cursor.fetchmany(batch_size)
+            if not batch:
+                break
+            # Only the current batch is held in memory, the rest stays on the server
+            f.writelines(json.dumps(row, default=str) + '\n' for row in batch)
+            rows += len(batch)
+        size = f.tell()
+
+    return {"rows": rows, "bytes": size}
+
+def stream_table_data(connection, schema_cache: Dict, output_dir: str, batch_size: int = 10000) -> Dict[str, Dict]:
+    """Export every table to output_dir/<table>.jsonl with constant memory, whatever the table size."""
+    os.makedirs(output_dir, exist_ok=True)
+    summary = {}
+    try:
+        # Unbuffered cursor: rows are pulled from the server as fetchmany asks for them
+        cursor = connection.cursor(dictionary=True, buffered=False)
+
+        for table_name, table_info in schema_cache.items():
+            print(f"Streaming data from table: {table_name}")
+            column_names = list(table_info['columns'].keys())
+            output_file = os.path.join(output_dir, f"{table_name}.jsonl")
+            summary[table_name] = export_table_to_file(cursor, table_name, column_names, output_file, batch_size,
+                                                       table_info.get('where'))
+            print(f"Wrote {summary[table_name]['rows']} rows to {output_file}")
+
+    except mysql.connector.Error as err:
+        print(f"Error streaming data: {err}")
+    finally:
+        cursor.close()
+
+    return summary
+
+def read_table_stream(output_dir: str, table_name: str):
+    """Yield the rows of a table exported by stream_table_data, one dict at a time."""
+    # Chunked exports are read back in primary key order through their manifest
+    manifest = load_chunk_manifest(output_dir, table_name)
+    if manifest:
+        filenames = [os.path.join(output_dir, chunk['file']) for chunk in manifest['chunks']]
+    else:
+        filenames = [os.path.join(output_dir, f"{table_name}.jsonl")]
+
+    for filename in filenames:
+        try:
+            with open(filename, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+        except FileNotFoundError:
+            print(f"Table stream {filename} not found")
+
+def get_primary_key(table_info: Dict):
+    """Return the single primary key column of a table, or None if the key is missing or composite."""
+    pk_columns = [col for col, definition in table_info['columns'].items() if 'PRIMARY KEY' in definition]
+    return pk_columns[0] if len(pk_columns) == 1 else None
+
+def plan_pk_chunks(cursor, table_name: str, pk: str, pk_definition: str, estimated_rows: int,
+                   chunk_rows: int) -> List[List]:
+    """Split the primary key space of a table into [lower, upper] ranges of about chunk_rows rows each.
+
+    The lower bound is exclusive and the upper bound inclusive; None means unbounded.
+    """
+    boundaries = []
+    if pk_definition.split()[0].split('(')[0] in INTEGER_TYPES:
+        # Integer keys: split MIN..MAX arithmetically, sized by the estimated row density
+        cursor.execute(f"SELECT MIN(`{pk}`), MAX(`{pk}`) FROM `{table_name}`")
+        low, high = cursor.fetchone()
+        if low is not None:
+            chunk_count = max(1, -(-estimated_rows // chunk_rows))
+            step = max(1, (high - low + 1) // chunk_count)
+            boundaries = list(range(low + step - 1, high, step))
+    else:
+        # Other orderable keys: walk the primary key index, one boundary every chunk_rows keys
+        last_key = None
+        while True:
+            if last_key is None:
+                cursor.execute(f"SELECT `{pk}` FROM `{table_name}` ORDER BY `{pk}` LIMIT 1 OFFSET %s",
+                               (chunk_rows - 1,))
+            else:
+                cursor.execute(f"SELECT `{pk}` FROM `{table_name}` WHERE `{pk}` > %s ORDER BY `{pk}` LIMIT 1 OFFSET %s",
+                               (last_key, chunk_rows - 1))
+            row = cursor.fetchone()
+            if row is None:
+                break
+            last_key = row[0]
+            boundaries.append(last_key)
+
+    bounds = [None] + boundaries + [None]
+    return [[bounds[i], bounds[i + 1]] for i in range(len(bounds) - 1)]
+
+def export_pk_range(cursor, table_name: str, column_names: List[str], pk: str, lower, upper, output_file: str,
+                    batch_size: int = 10000, where: str = None) -> Dict[str, int]:
+    """Export the rows with lower < pk <= upper using keyset pagination, publishing the file atomically."""
+    column_list = ', '.join(f"`{col}`" for col in column_names)
+    rows = 0
+    last_key = lower
+    with open(output_file + '.part', 'w', encoding='utf-8') as f:
+        while True:
+            conditions, params = [], []
+            if last_key is not None:
+                conditions.append(f"`{pk}` > %s")
+                params.append(last_key)
+            if upper is not None:
+                conditions.append(f"`{pk}` <= %s")
+                params.append(upper)
+            cursor.execute(f"SELECT {column_list} FROM `{table_name}`{where_clause({'where': where}, conditions)} "
+                           f"ORDER BY `{pk}` LIMIT {int(batch_size)}", params)
+            batch = cursor.fetchall()
+            if not batch:
+                break
+            f.writelines(json.dumps(row, default=str) + '\n' for row in batch)
+            rows += len(batch)
+            last_key = batch[-1][pk]
+            if len(batch) < batch_size:
+                break
+        size = f.tell()
+
+    # A chunk file only appears once it is complete, so a crash never leaves a half chunk behind
+    os.replace(output_file + '.part', output_file)
+    return {"rows": rows, "bytes": size}
+
+def encode_bound(value):
+    """Encode a chunk bound for the manifest so it comes back with its type; bytes keys are stored as hex."""
+    if value is None or isinstance(value, (int, float, str)):
+        return value
+    if isinstance(value, (bytes, bytearray)):
+        return {"type": "bytes", "value": bytes(value).hex()}
+    if isinstance(value, datetime):  # Must come before date, datetime is a subclass of date
+        return {"type": "datetime", "value": value.isoformat()}
+    if isinstance(value, date):
+        return {"type": "date", "value": value.isoformat()}
+    if isinstance(value, Decimal):
+        return {"type": "decimal", "value": str(value)}
+    raise ValueError(f"Unsupported primary key type for chunking: {type(value).__name__}")
+
+def decode_bound(value):
+    """Undo encode_bound."""
+    if not isinstance(value, dict):
+        return value
+    if value['type'] == 'bytes':
+        return bytes.fromhex(value['value'])
+    if value['type'] == 'datetime':
+        return datetime.fromisoformat(value['value'])
+    if value['type'] == 'date':
+        return date.fromisoformat(value['value'])
+    return Decimal(value['value'])
+
+def load_chunk_manifest(output_dir: str, table_name: str) -> Dict:
+    """Load the chunk manifest of a table, or return an empty dict if the table was not chunked."""
+    try:
+        with open(os.path.join(output_dir, f"{table_name}.manifest.json"), 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def save_chunk_manifest(output_dir: str, table_name: str, manifest: Dict) -> None:
+    """Write the chunk manifest of a table atomically."""
+    filename = os.path.join(output_dir, f"{table_name}.manifest.json")
+    with open(filename + '.part', 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(filename + '.part', filename)
+
+def plan_table_chunks(cursor, output_dir: str, table_name: str, pk: str, pk_definition: str,
+                      estimated_rows: int, chunk_rows: int) -> Dict:
+    """Return the chunk manifest of a table, reusing an existing one so an interrupted export resumes."""
+    manifest = load_chunk_manifest(output_dir, table_name)
+    if manifest.get('primary_key') == pk:
+        if any(chunk['status'] == 'done' for chunk in manifest['chunks']):
+            print(f"Warning: resuming table {table_name} from the export started at "
+                  f"{manifest.get('snapshot', 'an unknown time')}; the finished chunks hold rows from that "
+                  f"snapshot, not the current one. Delete {table_name}.manifest.json to export it from scratch.")
+        return manifest
+
+    os.makedirs(os.path.join(output_dir, f"{table_name}.chunks"), exist_ok=True)
+    ranges = plan_pk_chunks(cursor, table_name, pk, pk_definition, estimated_rows, chunk_rows)
+    manifest = {
+        "table": table_name,
+        "primary_key": pk,
+        "snapshot": datetime.now().isoformat(),
+        "chunks": [
+            {"file": os.path.join(f"{table_name}.chunks", f"{index:05d}.jsonl"),
+             "lower": encode_bound(lower), "upper": encode_bound(upper), "status": "pending"}
+            for index, (lower, upper) in enumerate(ranges)
+        ]
+    }
+    save_chunk_manifest(output_dir, table_name, manifest)
+    print(f"Split table {table_name} into {len(ranges)} chunks on `{pk}`")
+    return manifest
+
+def open_snapshot_connections(connection_params: Dict, workers: int, lock_tables: bool = True) -> List:
+    """Open up to `workers` connections whose transactions all read from the same point in time."""
+    connections = []
+    coordinator = None
+    if lock_tables:
+        # Hold a global read lock while the snapshots start so no write can land between them
+        coordinator = create_connection(**connection_params)
+        if coordinator:
+            try:
+                lock_cursor = coordinator.cursor()
+                lock_cursor.execute("FLUSH TABLES WITH READ LOCK")
+                lock_cursor.close()
+            except mysql.connector.Error as err:
+                print(f"Could not lock tables for the snapshot, continuing without it: {err}")
+                close_connection(coordinator)
+                coordinator = None
+
+    try:
+        for _ in range(workers):
+            connection = create_connection(**connection_params)
+            if connection is None:
+                break
+            cursor = connection.cursor()
+            cursor.execute("SET SESSION TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+            cursor.execute("START TRANSACTION WITH CONSISTENT SNAPSHOT, READ ONLY")
+            cursor.close()
+            connections.append(connection)
+    finally:
+        if coordinator:
+            unlock_cursor = coordinator.cursor()
+            unlock_cursor.execute("UNLOCK TABLES")
+            unlock_cursor.close()
+            close_connection(coordinator)
+
+    return connections
+
+def print_export_summary(summary: Dict[str, Dict]) -> None:
+    """Print rows, bytes and time per exported table, plus the totals."""
+    print(f"{'table':<40} {'rows':>12} {'bytes':>14} {'seconds':>9}")
+    for table_name, stats in summary.items():
+        if 'error' in stats:
+            print(f"{table_name:<40} FAILED: {stats['error']}")
+            continue
+        print(f"{table_name:<40} {stats['rows']:>12} {stats['bytes']:>14} {stats['seconds']:>9.2f}")
+    total_rows = sum(stats.get('rows', 0) for stats in summary.values())
+    total_bytes = sum(stats.get('bytes', 0) for stats in summary.values())
+    print(f"{'TOTAL':<40} {total_rows:>12} {total_bytes:>14}")
+
+def export_tables_parallel(connection_params: Dict, schema_cache: Dict, output_dir: str, workers: int = 4,
+                           batch_size: int = 10000, lock_tables: bool = True, chunk_rows: int = 0) -> Dict[str, Dict]:
+    """Export tables to output_dir over a pool of connections sharing one consistent snapshot.
+
+    With chunk_rows set, tables with a single-column primary key and more than chunk_rows estimated
+    rows are split into primary key ranges that are exported concurrently and listed in
+    <table>.manifest.json. Chunks already marked done are skipped when the export is run again,
+    with a warning since they hold rows from the earlier snapshot; delete the manifest to export
+    the table from scratch.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    connections = open_snapshot_connections(connection_params, workers, lock_tables)
+    if not connections:
+        print("Error: could not open any connection for the parallel export")
+        return {}
+
+    # Plan the chunks inside the snapshot so the ranges match the data being exported
+    manifests = {}
+    if chunk_rows:
+        planner = connections[0].cursor(buffered=True)
+        planner.execute("SELECT TABLE_NAME, TABLE_ROWS FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_SCHEMA = DATABASE()")
+        estimated_rows = {table_name: rows or 0 for table_name, rows in planner.fetchall()}
+        for table_name, table_info in schema_cache.items():
+            pk = get_primary_key(table_info)
+            if pk and estimated_rows.get(table_name, 0) > chunk_rows:
+                manifests[table_name] = plan_table_chunks(planner, output_dir, table_name, pk,
+                                                          table_info['columns'][pk],
+                                                          estimated_rows[table_name], chunk_rows)
+        planner.close()
+
+    # Chunks of the big tables go first so they do not end up as the long tail
+    tasks = []
+    for table_name, manifest in manifests.items():
+        tasks.extend((table_name, chunk) for chunk in manifest['chunks'] if chunk['status'] != 'done')
+    tasks.extend((table_name, None) for table_name in schema_cache if table_name not in manifests)
+
+    # Each worker thread borrows a connection for one task at a time
+    pool = queue.Queue()
+    for connection in connections:
+        pool.put(connection)
+    manifest_lock = threading.Lock()
+
+    def export_one(table_name: str, chunk: Dict) -> Dict[str, int]:
+        connection = pool.get()
+        cursor = connection.cursor(dictionary=True, buffered=False)
+        try:
+            started = time.perf_counter()
+            column_names = list(schema_cache[table_name]['columns'].keys())
+            if chunk is None:
+                output_file = os.path.join(output_dir, f"{table_name}.jsonl")
+                stats = export_table_to_file(cursor, table_name, column_names, output_file, batch_size,
+                                             schema_cache[table_name].get('where'))
+                # A manifest left by an earlier chunked run would shadow the fresh file for readers
+                stale_manifest = os.path.join(output_dir, f"{table_name}.manifest.json")
+                if os.path.exists(stale_manifest):
+                    os.remove(stale_manifest)
+            else:
+                output_file = os.path.join(output_dir, chunk['file'])
+                stats = export_pk_range(cursor, table_name, column_names, manifests[table_name]['primary_key'],
+                                        decode_bound(chunk['lower']), decode_bound(chunk['upper']),
+                                        output_file, batch_size, schema_cache[table_name].get('where'))
+                with manifest_lock:
+                    chunk.update(status="done", rows=stats['rows'], bytes=stats['bytes'])
+                    save_chunk_manifest(output_dir, table_name, manifests[table_name])
+            stats['seconds'] = time.perf_counter() - started
+            return stats
+        finally:
+            cursor.close()
+            pool.put(connection)
+
+    summary = {}
+    try:
+        with ThreadPoolExecutor(max_workers=len(connections)) as executor:
+            futures = {executor.submit(export_one, table_name, chunk): (table_name, chunk) for table_name, chunk in tasks}
+            for future in as_completed(futures):
+                table_name, chunk = futures[future]
+                stats = summary.setdefault(table_name, {"rows": 0, "bytes": 0, "seconds": 0.0})
+                try:
+                    result = future.result()
+                    for key in ("rows", "bytes", "seconds"):
+                        stats[key] += result[key]
+                    if chunk is None:
+                        print(f"Exported table {table_name}: {result['rows']} rows")
+                except Exception as err:
+                    stats["error"] = str(err)
+                    print(f"Error exporting table {table_name}: {err}")
+    finally:
+        for connection in connections:
+            connection.rollback()  # End the read-only snapshot transaction
+            close_connection(connection)
+
+    # Count chunks finished by earlier runs too, so the summary covers the whole table
+    for table_name, manifest in manifests.items():
+        stats = summary.setdefault(table_name, {"rows": 0, "bytes": 0, "seconds": 0.0})
+        if 'error' not in stats:
+            stats['rows'] = sum(chunk.get('rows', 0) for chunk in manifest['chunks'])
+            stats['bytes'] = sum(chunk.get('bytes', 0) for chunk in manifest['chunks'])
+            print(f"Exported table {table_name}: {stats['rows']} rows in {len(manifest['chunks'])} chunks")
+
+    # Report in schema order rather than completion order
+    summary = {table_name: summary[table_name] for table_name in schema_cache if table_name in summary}
+    print_export_summary(summary)
+    return summary
+
+
+def choose_watermark(table_info: Dict) -> List[str]:
+    """Pick the columns that order new rows of a table: updated_at plus the primary key, or an AUTO_INCREMENT key.
+
+    Returns an empty list when the table has no usable watermark and must be exported in full.
+    """
+    pk = get_primary_key(table_info)
+    if pk is None:
+        return []
+    for col in WATERMARK_COLUMNS:
+        # A NULL timestamp would end up in the checkpoint and no later row would compare greater than it
+        if col in table_info['columns'] and 'NOT NULL' in table_info['columns'][col]:
+            return [col, pk]  # The key breaks ties between rows updated in the same instant
+    if 'AUTO_INCREMENT' in table_info['columns'][pk]:
+        return [pk]
+    return []
+
+def load_checkpoint(output_dir: str, table_name: str) -> Dict:
+    """Load the incremental export checkpoint of a table, or an empty dict if there is none."""
+    try:
+        with open(os.path.join(output_dir, f"{table_name}.checkpoint.json"), 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def save_checkpoint(output_dir: str, table_name: str, checkpoint: Dict) -> None:
+    """Write the incremental export checkpoint of a table atomically."""
+    filename = os.path.join(output_dir, f"{table_name}.checkpoint.json")
+    with open(filename + '.part', 'w') as f:
+        json.dump(checkpoint, f, default=str)
+    os.replace(filename + '.part', filename)
+
+def export_table_incremental(cursor, output_dir: str, table_name: str, column_names: List[str], watermark: List[str],
+                             batch_size: int = 10000, where: str = None) -> Dict[str, int]:
+    """Append the rows of a table that are past its checkpoint to output_dir/<table>.jsonl.
+
+    The checkpoint is saved after every batch together with the file size at that point, so an
+    interrupted run drops any half-written batch and resumes right after the last saved row.
+    With an updated_at watermark, changed rows are appended again, and deleted rows stay in the
+    file; run compact_incremental_export from time to time to fold them away.
+    """
+    output_file = os.path.join(output_dir, f"{table_name}.jsonl")
+    checkpoint = load_checkpoint(output_dir, table_name)
+    if checkpoint.get('columns') != watermark or not os.path.exists(output_file):
+        checkpoint = {"columns": watermark, "last": None, "rows": 0, "offset": 0}
+    elif os.path.getsize(output_file) < checkpoint['offset']:
+        # Compacted just before a crash, ahead of the checkpoint; the compacted file is complete
+        checkpoint['offset'] = os.path.getsize(output_file)
+
+    column_list = ', '.join(f"`{col}`" for col in column_names)
+    order_by = ', '.join(f"`{col}`" for col in watermark)
+    rows = 0
+
+    with open(output_file, 'ab') as f:
+        f.truncate(checkpoint['offset'])
+        while True:
+            last = checkpoint['last']
+            if last is None:
+                conditions, params = [], ()
+            elif len(watermark) == 1:
+                conditions, params = [f"`{watermark[0]}` > %s"], (last[0],)
+            else:
+                updated, pk = watermark
+                conditions = [f"(`{updated}` > %s OR (`{updated}` = %s AND `{pk}` > %s))"]
+                params = (last[0], last[0], last[1])
+            cursor.execute(f"SELECT {column_list} FROM `{table_name}`{where_clause({'where': where}, conditions)} "
+                           f"ORDER BY {order_by} LIMIT {int(batch_size)}", params)
+            batch = cursor.fetchall()
+            if not batch:
+                break
+
+            f.write(''.join(json.dumps(row, default=str) + '\n' for row in batch).encode('utf-8'))
+            f.flush()
+            os.fsync(f.fileno())
+            rows += len(batch)
+            checkpoint.update(last=[batch[-1][col] for col in watermark], rows=checkpoint['rows'] + len(batch),
+                              offset=f.tell())
+            save_checkpoint(output_dir, table_name, checkpoint)
+            if len(batch) < batch_size:
+                break
+
+    return {"rows": rows, "bytes": checkpoint['offset']}
+
+def export_incremental(connection, schema_cache: Dict, output_dir: str, batch_size: int = 10000) -> Dict[str, Dict]:
+    """Export only the rows added or changed since the last run, using a checkpoint file per table.
+
+    Tables without a usable watermark column are exported in full every time.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    summary = {}
+    try:
+        cursor = connection.cursor(dictionary=True)
+
+        for table_name, table_info in schema_cache.items():
+            column_names = list(table_info['columns'].keys())
+            watermark = choose_watermark(table_info)
+            if watermark:
+                summary[table_name] = export_table_incremental(cursor, output_dir, table_name, column_names,
+                                                               watermark, batch_size, table_info.get('where'))
+                print(f"Appended {summary[table_name]['rows']} new rows from table {table_name}")
+            else:
+                output_file = os.path.join(output_dir, f"{table_name}.jsonl")
+                summary[table_name] = export_table_to_file(cursor, table_name, column_names, output_file, batch_size,
+                                                           table_info.get('where'))
+                print(f"No watermark for table {table_name}, exported all {summary[table_name]['rows']} rows")
+
+    except mysql.connector.Error as err:
+        print(f"Error exporting incrementally: {err}")
+    finally:
+        cursor.close()
+
+    return summary
+
+def iter_sorted_rows(file_path: str, pk: str, run_lines: int = 1000000):
+    """Yield (key, line) for every line of a JSON Lines file in key order, lines of equal keys in file order.
+
+    Runs of run_lines lines are sorted in memory and, when the file holds more than one run,
+    spilled to temporary files that are merged back, so memory stays bounded by run_lines.
+    """
+    def keyed(lines):
+        for line in lines:
+            yield json.loads(line)[pk], line
+
+    run_files = []
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            while True:
+                chunk = list(itertools.islice(f, run_lines))
+                if not chunk:
+                    break
+                run = sorted(keyed(line for line in chunk if line.strip()), key=lambda item: item[0])
+                if not run_files and len(chunk) < run_lines:
+                    yield from run  # The whole file fits in one run
+                    return
+                run_file = tempfile.TemporaryFile('w+', encoding='utf-8', dir=os.path.dirname(file_path))
+                run_file.writelines(line for _, line in run)
+                run_file.seek(0)
+                run_files.append(run_file)
+        # heapq.merge keeps equal keys in the order of the runs, which is the file order
+        yield from heapq.merge(*(keyed(run_file) for run_file in run_files), key=lambda item: item[0])
+    finally:
+        for run_file in run_files:
+            run_file.close()
+
+def iter_table_keys(cursor, table_name: str, pk: str, where: str = None, batch_size: int = 10000):
+    """Yield the primary keys of a table in order, one keyset page of batch_size keys at a time."""
+    last_key = None
+    while True:
+        conditions, params = ([f"`{pk}` > %s"], (last_key,)) if last_key is not None else ([], ())
+        cursor.execute(f"SELECT `{pk}` FROM `{table_name}`{where_clause({'where': where}, conditions)} "
+                       f"ORDER BY `{pk}` LIMIT {int(batch_size)}", params)
+        batch = cursor.fetchall()
+        for row in batch:
+            yield row[pk]
+        if len(batch) < batch_size:
+            return
+        last_key = batch[-1][pk]
+
+def compact_incremental_file(cursor, output_dir: str, table_name: str, pk: str, where: str = None,
+                             batch_size: int = 10000, run_lines: int = 1000000) -> Dict[str, int]:
+    """Rewrite an incremental export with the last line of each key only, and only keys still in the table.
+
+    The file is sorted by key (see iter_sorted_rows) and merged against the table's keys, read
+    in order through a keyset scan, so neither side is held in memory. The file comes out in key
+    order. It is only replaced, and its checkpoint updated, when something was removed.
+    """
+    output_file = os.path.join(output_dir, f"{table_name}.jsonl")
+    keys = iter_table_keys(cursor, table_name, pk, where, batch_size)
+    live_key = next(keys, None)
+    kept = removed = 0
+    with open(output_file + '.part', 'w', encoding='utf-8') as target:
+        for key, group in itertools.groupby(iter_sorted_rows(output_file, pk, run_lines), key=lambda item: item[0]):
+            lines = [line for _, line in group]
+            while live_key is not None and live_key < key:
+                live_key = next(keys, None)
+            if live_key == key:
+                target.write(lines[-1])
+                kept += 1
+                removed += len(lines) - 1
+            else:
+                removed += len(lines)
+
+    if not removed:
+        os.remove(output_file + '.part')
+        return {"rows": kept, "removed": 0}
+    os.replace(output_file + '.part', output_file)
+    checkpoint = load_checkpoint(output_dir, table_name)
+    if checkpoint:
+        checkpoint.update(rows=kept, offset=os.path.getsize(output_file))
+        save_checkpoint(output_dir, table_name, checkpoint)
+    return {"rows": kept, "removed": removed}
+
+def compact_incremental_export(connection, schema_cache: Dict, output_dir: str, batch_size: int = 10000,
+                               run_lines: int = 1000000) -> Dict[str, Dict]:
+    """Fold the files of export_incremental down to the latest version of each row, dropping deleted rows.
+
+    A separate step to run now and then, not while export_incremental runs: it reads every file
+    and every key of its table once. Only tables with an integer primary key are compacted, so
+    the key order of the file matches the order the server returns the keys in.
+    """
+    summary = {}
+    try:
+        cursor = connection.cursor(dictionary=True)
+
+        for table_name, table_info in schema_cache.items():
+            pk = get_primary_key(table_info)
+            if not load_checkpoint(output_dir, table_name) or \
+                    not os.path.exists(os.path.join(output_dir, f"{table_name}.jsonl")):
+                continue
+            if pk is None or table_info['columns'][pk].split()[0].split('(')[0] not in INTEGER_TYPES:
+                print(f"Skipping compaction of table {table_name}: it needs a single integer primary key")
+                continue
+            summary[table_name] = compact_incremental_file(cursor, output_dir, table_name, pk,
+                                                           table_info.get('where'), batch_size, run_lines)
+            print(f"Compacted table {table_name}: {summary[table_name]['rows']} rows kept, "
+                  f"{summary[table_name]['removed']} outdated or deleted rows dropped")
+
+    except mysql.connector.Error as err:
+        print(f"Error compacting the incremental export: {err}")
+    finally:
+        cursor.close()
+
+    return summary
+
+
+def get_primary_key_columns(table_info: Dict) -> List[str]:
+    """Return all primary key columns of a table, in column order."""
+    return [col for col, definition in table_info['columns'].items() if 'PRIMARY KEY' in definition]
+
+def sample_predicate(table_info: Dict, percent: float) -> str:
+    """Build a predicate that keeps about percent % of a table, the same rows on every run."""
+    key_columns = get_primary_key_columns(table_info) or list(table_info['columns'].keys())
+    key = f"CONCAT_WS('|', {', '.join(f'`{col}`' for col in key_columns)})"
+    return f"MOD(CRC32({key}), 10000) < {int(percent * 100)}"
+
+def export_subset(connection, schema_cache: Dict, roots: Dict[str, Dict], batch_size: int = 1000) -> Dict[str, Dict]:
+    """Export a referentially closed subset of the database, starting from seed rows of some root tables.
+
+    roots maps a table to {"where": predicate} and/or {"percent": 5}. Every row pulled in is then
+    followed through the foreign keys of the snapshot: the parent rows it references are fetched
+    with batched IN (...) lookups, and so on until nothing new is referenced. Returns a data cache
+    with the tables ordered parents first, ready for save_cache_to_file or delivery.generate_sql_file
+    (pass renumber_ids=False there, so the keys still match).
+    """
+    subset = {table_name: {} for table_name in schema_cache}  # table -> row key -> row
+    requested = {}  # (table, columns) -> key values already looked up
+    pending = []  # (table, rows) whose foreign keys have not been followed yet
+
+    def add_rows(table_name: str, rows: List[Dict]) -> None:
+        key_columns = get_primary_key_columns(schema_cache[table_name]) or list(schema_cache[table_name]['columns'])
+        new_rows = []
+        for row in rows:
+            key = tuple(row[col] for col in key_columns)
+            if key not in subset[table_name]:
+                subset[table_name][key] = row
+                new_rows.append(row)
+        if new_rows:
+            pending.append((table_name, new_rows))
+
+    try:
+        cursor = connection.cursor(dictionary=True)
+
+        # Seed rows
+        for table_name, root in roots.items():
+            table_info = schema_cache[table_name]
+            conditions = []
+            if root.get('where'):
+                conditions.append(f"({root['where']})")
+            if root.get('percent') is not None:
+                conditions.append(sample_predicate(table_info, root['percent']))
+            column_list = ', '.join(f"`{col}`" for col in table_info['columns'])
+            cursor.execute(f"SELECT {column_list} FROM `{table_name}`{where_clause({}, conditions)}")
+            rows = cursor.fetchall()
+            add_rows(table_name, rows)
+            print(f"Seeded {len(rows)} rows from table {table_name}")
+
+        # Follow foreign keys until every referenced row is in the subset
+        while pending:
+            table_name, rows = pending.pop()
+            for foreign_key in schema_cache[table_name].get('foreign_keys', {}).values():
+                parent = foreign_key['referenced_table']
+                if parent not in schema_cache:
+                    continue
+                columns, parent_columns = foreign_key['columns'], tuple(foreign_key['referenced_columns'])
+                seen = requested.setdefault((parent, parent_columns), set())
+                values = {tuple(row.get(col) for col in columns) for row in rows}
+                values = [value for value in values if None not in value and value not in seen]
+                seen.update(values)
+
+                parent_list = ', '.join(f"`{col}`" for col in schema_cache[parent]['columns'])
+                key = f"({', '.join(f'`{col}`' for col in parent_columns)})"
+                placeholder = f"({', '.join(['%s'] * len(parent_columns))})"
+                for start in range(0, len(values), batch_size):
+                    batch = values[start:start + batch_size]
+                    cursor.execute(f"SELECT {parent_list} FROM `{parent}` "
+                                   f"WHERE {key} IN ({', '.join([placeholder] * len(batch))})",
+                                   [value for values_row in batch for value in values_row])
+                    add_rows(parent, cursor.fetchall())
+
+    except mysql.connector.Error as err:
+        print(f"Error exporting subset: {err}")
+    finally:
+        cursor.close()
+
+    # Parents before children, so the data loads in order; cycles keep schema order
+    ordered = []
+    remaining = [table_name for table_name in schema_cache if subset[table_name]]
+    while remaining:
+        ready = [table_name for table_name in remaining
+                 if not any(fk['referenced_table'] in remaining and fk['referenced_table'] != table_name
+                            for fk in schema_cache[table_name].get('foreign_keys', {}).values())] or remaining[:1]
+        ordered.extend(ready)
+        remaining = [table_name for table_name in remaining if table_name not in ready]
+
+    data_cache = {}
+    for table_name in ordered:
+        data_cache[table_name] = {
+            "data": list(subset[table_name].values()),
+            "last_updated": datetime.now().isoformat()
+        }
+        print(f"Subset of table {table_name}: {len(data_cache[table_name]['data'])} rows")
+    return data_cache
 
 def save_cache_to_file(cache: Dict, filename: str):
     """Save the cache to a JSON file."""
@@ -224,9 +1173,35 @@ if __name__ == "__main__":
     if db_connection:
         # Cache schema and data
         schema_cache = cache_database_schema(db_connection)
+        # # Or leave tables, columns and rows out of the export entirely, instead of removing them afterwards
+        # export_filter = {
+        #     "exclude": ["_prisma_migrations", "_OwnerOrganization"],
+        #     "exclude_columns": {"*": ["authentication_string", "*_priv"]},
+        #     "where": {"orders": "created_at >= '2024-01-01'"}
+        # }
+        # schema_cache = cache_database_schema(db_connection, export_filter)
+        # # Or refresh the previous snapshot, re-reading only the tables that changed since
+        # schema_cache = cache_database_schema_incremental(
+        #     db_connection, load_cache_from_file(os.path.join(script_dir, 'schema/latest_schema.json')))
         data_cache = cache_table_data(db_connection, schema_cache)
 
-        
+        # # For large tables, stream each table to cache/<table>.jsonl instead of holding it in memory
+        # stream_table_data(db_connection, schema_cache, os.path.join(script_dir, 'cache'))
+
+        # # Or export several tables at once over 8 connections reading the same consistent snapshot
+        # connection_params = {"host": host, "user": user, "password": password, "database": database}
+        # export_tables_parallel(connection_params, schema_cache, os.path.join(script_dir, 'cache'), workers=8)
+        # # Add chunk_rows=1000000 to also split big tables into primary key ranges exported side by side
+
+        # # Or only append rows added or updated since the last run, tracked in cache/<table>.checkpoint.json
+        # export_incremental(db_connection, schema_cache, os.path.join(script_dir, 'cache'))
+        # # Now and then, fold updated rows into one line per key and drop deleted rows
+        # compact_incremental_export(db_connection, schema_cache, os.path.join(script_dir, 'cache'))
+
+        # # Or export a small, referentially closed subset for test fixtures: 1% of orders plus every row they reference
+        # subset_cache = export_subset(db_connection, schema_cache, {"orders": {"percent": 1}})
+        # save_cache_to_file(subset_cache, os.path.join(script_dir, 'cache/subset_data_cache.json'))
+
         # # Define columns to be removed
         # columns_to_remove = [
         #     'Host', 'User', 'Select_priv', 'Insert_priv', 'Update_priv', 
@@ -259,6 +1234,9 @@ if __name__ == "__main__":
         # Save caches to files using the script directory
         save_cache_to_file(schema_cache, os.path.join(script_dir, 'schema/latest_schema.json'))  # Update this line
         # save_cache_to_file(data_cache, os.path.join(script_dir, 'cache/local_data_cache.json'))  # Update this line
+        # # Or keep the data typed and columnar, so readers can open one table or column at a time
+        # from columnar_cache import write_columnar_cache
+        # write_columnar_cache(data_cache, os.path.join(script_dir, 'cache/columnar'), schema_cache, compression='zlib')
 
         # Example of loading cache
         # loaded_schema = load_cache_from_file(os.path.join(script_dir, 'schema/latest_schema.json'))  # Update this line
@@ -0,0 +1,171 @@
+import mysql.connector
+from typing import Dict, List
+import queue
+import threading
+import time
+
+from read_from_db import create_connection, close_connection, cache_database_schema, where_clause
+
+INSERT_VERBS = {"insert": "INSERT", "ignore": "INSERT IGNORE", "replace": "REPLACE"}
+
+def build_copy_insert(table_name: str, column_names: List[str], mode: str = 'insert') -> str:
+    """Build the parameterized INSERT that executemany turns into multi-row inserts."""
+    columns = ', '.join(f"`{col}`" for col in column_names)
+    placeholders = ', '.join(['%s'] * len(column_names))
+    return f"{INSERT_VERBS[mode]} INTO `{table_name}` ({columns}) VALUES ({placeholders})"
+
+def produce_batches(source_connection, schema_cache: Dict, batches: queue.Queue, stop: threading.Event,
+                    stats: Dict, consumers: int, batch_size: int, mode: str) -> None:
+    """Stream every table from the source into the queue, batch_size rows at a time.
+
+    put() blocks while the queue is full, so reading never runs further ahead of the writers
+    than the queue allows. One None per consumer marks the end; the queue must hold at least that many.
+    """
+    cursor = source_connection.cursor(buffered=False)
+    try:
+        # Every table is read from the same point in time
+        cursor.execute("START TRANSACTION WITH CONSISTENT SNAPSHOT, READ ONLY")
+        for table_name, table_info in schema_cache.items():
+            column_names = list(table_info['columns'].keys())
+            column_list = ', '.join(f"`{col}`" for col in column_names)
+            insert_sql = build_copy_insert(table_name, column_names, mode)
+            stats[table_name] = {"read": 0, "written": 0, "seconds": 0.0, "started": time.perf_counter()}
+
+            cursor.execute(f"SELECT {column_list} FROM `{table_name}`{where_clause(table_info)}")
+            while not stop.is_set():
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                stats[table_name]['read'] += len(rows)
+                while not stop.is_set():
+                    try:
+                        batches.put((table_name, insert_sql, rows), timeout=1)
+                        break
+                    except queue.Full:
+                        continue
+            if stop.is_set():
+                break
+            print(f"Read table {table_name}: {stats[table_name]['read']} rows")
+        if stop.is_set():
+            # A writer failed with a table half read. Reading the rest just to discard it could take
+            # long, and rollback() refuses to run over the unread rows; closing the connection
+            # abandons both the result and the snapshot transaction.
+            source_connection.close()
+        else:
+            source_connection.rollback()  # End the snapshot transaction
+    except mysql.connector.Error as err:
+        print(f"Error reading from the source: {err}")
+        stop.set()
+    finally:
+        if stop.is_set():
+            # Nothing queued will be written any more; empty the queue so the end markers fit
+            while True:
+                try:
+                    batches.get_nowait()
+                except queue.Empty:
+                    break
+            for _ in range(consumers):
+                batches.put_nowait(None)
+        else:
+            for _ in range(consumers):
+                batches.put(None)
+        try:
+            cursor.close()
+        except mysql.connector.Error:
+            pass  # The connection is gone or still holds the result, which close_connection deals with
+
+def consume_batches(target_connection, batches: queue.Queue, stop: threading.Event, stats: Dict,
+                    stats_lock: threading.Lock, errors: List) -> None:
+    """Write batches from the queue to the target with executemany, one transaction per batch."""
+    cursor = target_connection.cursor()
+    try:
+        while True:
+            item = batches.get()
+            if item is None:
+                break
+            if stop.is_set():
+                continue  # Drain the queue so the producer is not left blocked
+            table_name, insert_sql, rows = item
+            try:
+                cursor.executemany(insert_sql, rows)
+                target_connection.commit()
+            except mysql.connector.Error as err:
+                target_connection.rollback()
+                errors.append(f"{table_name}: {err}")
+                stop.set()
+                continue
+            with stats_lock:
+                stats[table_name]['written'] += len(rows)
+                stats[table_name]['seconds'] = time.perf_counter() - stats[table_name]['started']
+    finally:
+        cursor.close()
+
+def copy_database(source_params: Dict, target_params: Dict, export_filter: Dict = None, workers: int = 4,
+                  batch_size: int = 1000, queue_batches: int = 16, mode: str = 'insert',
+                  bulk_session: bool = True) -> Dict[str, Dict]:
+    """Copy table data straight from the source database to the target, without intermediate files.
+
+    One producer streams rows from an unbuffered source cursor into a queue of at most queue_batches
+    batches; `workers` consumers, each with its own target connection, write them with executemany,
+    which the connector sends as multi-row INSERTs. Reading, encoding and writing overlap. The
+    tables must already exist on the target. mode is 'insert', 'ignore' or 'replace'; export_filter
+    works as in read_from_db.cache_database_schema. With bulk_session, foreign key and unique
+    checks are off on the target sessions, since tables are not written in dependency order.
+    """
+    source_connection = create_connection(**source_params)
+    if source_connection is None:
+        return {}
+    schema_cache = cache_database_schema(source_connection, export_filter)
+
+    target_connections = []
+    for _ in range(max(1, workers)):
+        connection = create_connection(**target_params)
+        if connection is None:
+            break
+        connection.autocommit = False
+        if bulk_session:
+            cursor = connection.cursor()
+            cursor.execute("SET SESSION unique_checks = 0, foreign_key_checks = 0")
+            cursor.close()
+        target_connections.append(connection)
+    if not target_connections:
+        print("Error: could not open any connection to the target")
+        close_connection(source_connection)
+        return {}
+
+    batches = queue.Queue(maxsize=max(queue_batches, len(target_connections)))  # Room for every end marker
+    stop = threading.Event()
+    stats = {}
+    stats_lock = threading.Lock()
+    errors = []
+    started = time.perf_counter()
+
+    threads = [threading.Thread(target=consume_batches, args=(connection, batches, stop, stats, stats_lock, errors))
+               for connection in target_connections]
+    for thread in threads:
+        thread.start()
+    try:
+        produce_batches(source_connection, schema_cache, batches, stop, stats, len(threads), batch_size, mode)
+    finally:
+        for thread in threads:
+            thread.join()
+        close_connection(source_connection)
+        for connection in target_connections:
+            close_connection(connection)
+
+    elapsed = time.perf_counter() - started
+    print(f"{'table':<40} {'rows read':>12} {'rows written':>12} {'seconds':>9}")
+    for table_name, table_stats in stats.items():
+        print(f"{table_name:<40} {table_stats['read']:>12} {table_stats['written']:>12} {table_stats['seconds']:>9.2f}")
+    total = sum(table_stats['written'] for table_stats in stats.values())
+    print(f"Copied {total} rows in {elapsed:.2f}s ({total / max(elapsed, 0.001):.0f} rows/s)")
+    for error in errors:
+        print(f"Error writing to the target: {error}")
+    return stats
+
+if __name__ == "__main__":
+    source = {"host": "localhost", "user": "root", "password": "", "database": ""}  # Database to copy from
+    target = {"host": "localhost", "user": "root", "password": "", "database": ""}  # Database to copy into
+    workers = 4  # Target connections writing in parallel
+
+    copy_database(source, target, workers=workers)
@@ -1,18 +1,26 @@
 import mysql.connector
 from mysql.connector import Error
 import os
+import re
+import json
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from sql_statements import SQL_FILE_SUFFIXES, execute_statements, iter_sql_statements, open_sql_file
 
 def create_database(connection, db_name):
     create_db_query = f"CREATE DATABASE IF NOT EXISTS {db_name}"
     execute_query(connection, create_db_query)
 
-def create_connection(host_name, user_name, user_password):
+def create_connection(host_name, user_name, user_password, allow_local_infile=False):
     connection = None
     try:
         connection = mysql.connector.connect(
             host=host_name,
             user=user_name,
-            password=user_password
+            password=user_password,
+            allow_local_infile=allow_local_infile  # Needed for LOAD DATA LOCAL INFILE loader scripts
         )
         print("Connection to MySQL DB successful")
     except Error as e:
@@ -28,51 +36,209 @@ def execute_query(connection, query):
     except Error as e:
         print(f"The error '{e}' occurred")
 
-def execute_sql_files(connection, directory):
+def execute_load_data_file(connection, file_path):
+    """Run a <table>.load.sql loader script written by delivery.py, resolving its data file next to the script."""
+    script_dir = os.path.dirname(os.path.abspath(file_path))
+
+    def resolve_infile(match):
+        infile = match.group(1)
+        if not os.path.isabs(infile):
+            infile = os.path.join(script_dir, infile)
+        return "LOCAL INFILE '" + infile.replace('\\', '\\\\').replace("'", "\\'") + "'"
+
+    with open(file_path, 'r', encoding='utf-8') as file:
+        commands = list(iter_sql_statements(file))
+    try:
+        cursor = connection.cursor()
+        for command in commands:
+            cursor.execute(re.sub(r"LOCAL INFILE '([^']*)'", resolve_infile, command))
+        connection.commit()
+        cursor.close()
+        print(f"Bulk load from {os.path.basename(file_path)} executed successfully.")
+        return True
+    except Error as e:
+        print(f"Error loading data from {os.path.basename(file_path)}. Rolling back.")
+        connection.rollback()
+        print(f"The error '{e}' occurred (LOAD DATA LOCAL needs allow_local_infile and local_infile=ON on the server)")
+        return False
+
+def execute_sql_file(connection, file_path, batch_size=1000, batch_bytes=16 * 1024 * 1024, bulk_session=False):
+    """Apply one SQL file (.sql, .sql.gz or .sql.zst) and return True if every statement in it succeeded."""
+    filename = os.path.basename(file_path)
+    if filename.endswith('.load.sql'):
+        # Bulk-load scripts reference a data file and need the local infile handling
+        return execute_load_data_file(connection, file_path)
+    with open_sql_file(file_path) as file:
+        # Statements are read one at a time, so the file never has to fit in memory
+        try:
+            executed = execute_statements(connection, iter_sql_statements(file), batch_size, batch_bytes,
+                                          bulk_session)
+            print(f"All {executed} commands from {filename} executed successfully.")
+            return True
+        except Error as e:
+            print(f"Error executing commands from {filename}. Rolled back the failed batch.")
+            print(f"The error '{e}' occurred")
+            return False
+
+def execute_sql_files(connection, directory, batch_size=1000, batch_bytes=16 * 1024 * 1024, bulk_session=False):
     for filename in os.listdir(directory):
-        if filename.endswith('.sql'):
-            file_path = os.path.join(directory, filename)
-            with open(file_path, 'r', encoding='utf-8') as file:
-                sql_commands = file.read()
-                # Split commands by semicolon, but handle multi-line statements
-                commands = sql_commands.split(';')
-                try:
-                    for command in commands:
-                        command = command.strip()
-                        if command:  # Avoid executing empty commands
-                            execute_query(connection, command)
-                    connection.commit()  # Commit all commands if successful
-                    print(f"All commands from {filename} executed successfully.")
-                except Error as e:
-                    print(f"Error executing commands from {filename}. Rolling back.")
-                    connection.rollback()  # Rollback on error
-                    print(f"The error '{e}' occurred")
+        if filename.endswith(SQL_FILE_SUFFIXES):
+            execute_sql_file(connection, os.path.join(directory, filename), batch_size, batch_bytes, bulk_session)
+
+def load_table_dependencies(schema_file):
+    """Map each table of a read_from_db.py schema snapshot to the tables its foreign keys reference."""
+    try:
+        with open(schema_file, 'r') as f:
+            schema_cache = json.load(f)
+    except FileNotFoundError:
+        print(f"Schema file '{schema_file}' not found, applying files without dependency order.")
+        return {}
+    return {
+        table_name: {fk['referenced_table'] for fk in table_info.get('foreign_keys', {}).values()} - {table_name}
+        for table_name, table_info in schema_cache.items()
+    }
+
+def execute_sql_files_parallel(connection_params, db_name, directory, schema_file, workers=4, batch_size=1000,
+                               batch_bytes=16 * 1024 * 1024, bulk_session=False):
+    """Apply per-table SQL files concurrently over a pool of connections, in foreign key order.
+
+    A <table>.sql (or <table>.load.sql) file starts only once the files of every table it references
+    are done; tables whose parent failed are skipped. Files that are not named after a table in
+    the snapshot, such as create_table.sql, are applied first, one after another.
+    """
+    filenames = sorted(filename for filename in os.listdir(directory) if filename.endswith(SQL_FILE_SUFFIXES))
+    dependencies = load_table_dependencies(schema_file)
+
+    table_files = {}
+    setup_files = []
+    for filename in filenames:
+        table_name = filename[:-len('.load.sql')] if filename.endswith('.load.sql') else \
+            filename[:filename.rindex('.sql')]
+        if table_name in dependencies:
+            table_files.setdefault(table_name, []).append(filename)
+        else:
+            setup_files.append(filename)
+
+    connections = []
+    for _ in range(max(1, workers)):
+        connection = create_connection(**connection_params)
+        if connection is None:
+            break
+        connection.database = db_name
+        connections.append(connection)
+    if not connections:
+        print("Failed to connect to the MySQL server.")
+        return {}
+
+    results = {}
+    for filename in setup_files:
+        started = time.perf_counter()
+        results[filename] = execute_sql_file(connections[0], os.path.join(directory, filename), batch_size,
+                                             batch_bytes, bulk_session)
+        print(f"{filename} applied in {time.perf_counter() - started:.2f}s")
+
+    # Only wait for referenced tables that have files of their own
+    waiting = {table_name: dependencies[table_name] & table_files.keys() for table_name in table_files}
+    pool = queue.Queue()
+    for connection in connections:
+        pool.put(connection)
+
+    def apply_table(table_name):
+        connection = pool.get()
+        try:
+            started = time.perf_counter()
+            ok = all([execute_sql_file(connection, os.path.join(directory, filename), batch_size, batch_bytes,
+                                       bulk_session) for filename in table_files[table_name]])
+            return ok, time.perf_counter() - started
+        finally:
+            pool.put(connection)
+
+    done = 0
+    failed = set()
+    with ThreadPoolExecutor(max_workers=len(connections)) as executor:
+        running = {}
+
+        def submit_ready():
+            for table_name in [name for name, parents in waiting.items() if not parents]:
+                del waiting[table_name]
+                running[executor.submit(apply_table, table_name)] = table_name
+
+        submit_ready()
+        while running:
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                table_name = running.pop(future)
+                ok, seconds = future.result()
+                done += 1
+                results[table_name] = ok
+                print(f"[{done}/{len(table_files)}] {table_name} {'applied' if ok else 'FAILED'} in {seconds:.2f}s")
+                if not ok:
+                    failed.add(table_name)
+                for parents in waiting.values():
+                    parents.discard(table_name)
+            # Descendants of a failed table would only hit foreign key errors
+            skipped = [name for name in waiting if dependencies[name] & failed]
+            while skipped:
+                for table_name in skipped:
+                    del waiting[table_name]
+                    failed.add(table_name)
+                    results[table_name] = False
+                    done += 1
+                    print(f"[{done}/{len(table_files)}] {table_name} skipped, a table it references failed")
+                skipped = [name for name in waiting if dependencies[name] & failed]
+            submit_ready()
+            if not running and waiting:
+                # Nothing can start, so the remaining tables reference each other in a cycle: release one
+                table_name, seen = min(waiting), set()
+                while table_name not in seen:  # Follow references until one repeats, it is on the cycle
+                    seen.add(table_name)
+                    table_name = min(waiting[table_name])
+                print(f"Foreign key cycle through {table_name}, applying it before the tables it references")
+                waiting[table_name].clear()
+                submit_ready()
+
+    for connection in connections:
+        if connection.is_connected():
+            connection.close()
+    print(f"Applied {sum(1 for ok in results.values() if ok)} of {len(results)} files/tables successfully.")
+    return results
 
 # Connection parameters
 host = "localhost"
 user = "root"  # Change to your MySQL username
 password = ""  # Change to your MySQL password
 db_name = ""  # Change to your database name
+batch_size = 1000  # Statements per transaction when applying SQL files
+bulk_session = False  # Set to True to disable unique_checks and foreign_key_checks while loading
+allow_local_infile = False  # Set to True to run the <table>.load.sql bulk-load scripts from delivery.py
+
+if __name__ == "__main__":
+    # Create a connection without specifying the database
+    conn = create_connection(host, user, password, allow_local_infile)
 
-# Create a connection without specifying the database
-conn = create_connection(host, user, password)
+    # Create the database if it doesn't exist
+    if conn is not None:
+        create_database(conn, db_name)
 
-# Create the database if it doesn't exist
-if conn is not None:
-    create_database(conn, db_name)
+        # Now connect to the new database
+        conn.database = db_name
 
-    # Now connect to the new database
-    conn.database = db_name
+        # Directory containing SQL files
+        sql_directory = os.path.join(os.getcwd(), 'sql_for_test')  # Change 'sql_for_test' to your directory name
 
-    # Directory containing SQL files
-    sql_directory = os.path.join(os.getcwd(), 'sql_for_test')  # Change 'sql_for_test' to your directory name
+        # Execute SQL files
+        execute_sql_files(conn, sql_directory, batch_size, bulk_session=bulk_session)
 
-    # Execute SQL files
-    execute_sql_files(conn, sql_directory)
+        # # Or apply the per-table files over 8 connections, parents before the tables referencing them
+        # connection_params = {"host_name": host, "user_name": user, "user_password": password,
+        #                      "allow_local_infile": allow_local_infile}
+        # execute_sql_files_parallel(connection_params, db_name, sql_directory,
+        #                            os.path.join(os.getcwd(), 'schema/latest_schema.json'), workers=8,
+        #                            batch_size=batch_size, bulk_session=bulk_session)
 
-    # Close the connection
-    if conn.is_connected():
-        conn.close()
-        print("MySQL connection is closed")
-else:
-    print("Failed to connect to the MySQL server.")
\ No newline at end of file
+        # Close the connection
+        if conn.is_connected():
+            conn.close()
+            print("MySQL connection is closed")
+    else:
+        print("Failed to connect to the MySQL server.")
\ No newline at end of file
@@ -1,6 +1,20 @@
 import mysql.connector
 from mysql.connector import Error
+import fnmatch
+import hashlib
 import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from itertools import groupby
+
+from sql_statements import SQL_FILE_SUFFIXES, execute_statements, iter_sql_statements, open_sql_file
+
+ALTER_TABLE = re.compile(r"\s*ALTER\s+TABLE\s+`?([\w$]+)`?\s+(.*?);?\s*$", re.IGNORECASE | re.DOTALL)
+# Online DDL hints from alter.py do not apply to the shadow table, which is empty when altered
+ONLINE_DDL_OPTION = re.compile(r",\s*(?:ALGORITHM|LOCK)\s*=\s*\w+", re.IGNORECASE)
+COLUMN_RENAME = re.compile(r"(?:^|,)\s*(?:CHANGE|RENAME\s+COLUMN)\b", re.IGNORECASE)
 
 def create_database(connection, db_name):
     create_db_query = f"CREATE DATABASE IF NOT EXISTS {db_name}"
@@ -28,51 +42,456 @@ def execute_query(connection, query):
     except Error as e:
         print(f"The error '{e}' occurred")
 
-def execute_sql_files(connection, directory):
-    for filename in os.listdir(directory):
-        if filename.endswith('.sql'):
+def get_primary_key_column(cursor, table_name):
+    """Return the primary key column of a table, or None unless the key is a single column."""
+    cursor.execute("""
+        SELECT COLUMN_NAME FROM INFORMATION_SCHEMA.KEY_COLUMN_USAGE
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND CONSTRAINT_NAME = 'PRIMARY'
+        ORDER BY ORDINAL_POSITION
+    """, (table_name,))
+    columns = [row[0] for row in cursor.fetchall()]
+    return columns[0] if len(columns) == 1 else None
+
+def get_copy_columns(cursor, table_name, shadow_name):
+    """Return the stored columns present in both the table and its shadow, in table order."""
+    cursor.execute("""
+        SELECT TABLE_NAME, COLUMN_NAME FROM INFORMATION_SCHEMA.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME IN (%s, %s) AND EXTRA NOT LIKE '%%GENERATED%%'
+        ORDER BY ORDINAL_POSITION
+    """, (table_name, shadow_name))
+    rows = cursor.fetchall()
+    shadow_columns = {col_name for name, col_name in rows if name == shadow_name}
+    return [col_name for name, col_name in rows if name == table_name and col_name in shadow_columns]
+
+def get_foreign_key_links(cursor, table_name):
+    """List the foreign keys a table has and the ones other tables have on it, as 'child.constraint -> parent'."""
+    cursor.execute("""
+        SELECT TABLE_NAME, CONSTRAINT_NAME, REFERENCED_TABLE_NAME FROM INFORMATION_SCHEMA.REFERENTIAL_CONSTRAINTS
+        WHERE CONSTRAINT_SCHEMA = DATABASE() AND (TABLE_NAME = %s OR REFERENCED_TABLE_NAME = %s)
+        ORDER BY TABLE_NAME, CONSTRAINT_NAME
+    """, (table_name, table_name))
+    return [f"{child}.{constraint} -> {parent}" for child, constraint, parent in cursor.fetchall()]
+
+def wait_for_capacity(cursor, replica_cursor=None, max_replica_lag=5, max_threads_running=50):
+    """Sleep while the replica is lagging or the server is busy, checking again every second."""
+    while True:
+        reasons = []
+        cursor.execute("SHOW GLOBAL STATUS LIKE 'Threads_running'")
+        threads_running = int(cursor.fetchone()[1])
+        if threads_running > max_threads_running:
+            reasons.append(f"Threads_running={threads_running}")
+        if replica_cursor is not None:
+            replica_cursor.execute("SHOW REPLICA STATUS")
+            status = replica_cursor.fetchone()
+            lag = None
+            if status is not None:
+                status = dict(zip(replica_cursor.column_names, status))
+                lag = status.get('Seconds_Behind_Source')
+            if lag is None or lag > max_replica_lag:  # A stopped replica reports NULL
+                reasons.append(f"replica lag={lag}")
+        if not reasons:
+            return
+        print(f"Throttling copy: {', '.join(reasons)}")
+        time.sleep(1)
+
+def online_alter_table(connection, table_name, alter_clauses, chunk_time=0.5, chunk_rows=1000,
+                       replica_connection=None, max_replica_lag=5, max_threads_running=50, drop_old_table=False):
+    """Apply an ALTER TABLE by copying rows into an altered shadow table, the way pt-online-schema-change does.
+
+    The shadow table is created LIKE the original and altered while empty. Triggers replay writes
+    made to the original while primary key ranges are copied with INSERT IGNORE. The chunk size
+    is adjusted so each chunk takes about chunk_time seconds, and copying pauses while the
+    replica lags more than max_replica_lag seconds or Threads_running exceeds max_threads_running.
+    An atomic RENAME TABLE swaps the tables at the end. The table needs a single-column primary
+    key and must not have or be referenced by foreign keys: CREATE TABLE ... LIKE drops its own,
+    and the ones of child tables would follow the old table through the rename. Once the swap is
+    done the ALTER counts as applied; a failure to clean up the triggers or the old table after
+    it is only reported. The original table is kept as _<table>_old until the next online
+    migration of the table, unless drop_old_table is set. Columns are copied by name, so ALTERs
+    that rename columns (CHANGE or RENAME COLUMN) are refused: the renamed columns would be lost.
+    """
+    shadow_name = f"_{table_name}_new"
+    old_name = f"_{table_name}_old"
+    triggers = [f"{table_name}_osc_{action}"[:64] for action in ('ins', 'upd', 'del')]
+
+    connection.autocommit = True
+    cursor = connection.cursor()
+    replica_cursor = replica_connection.cursor() if replica_connection is not None else None
+    try:
+        if COLUMN_RENAME.search(alter_clauses):
+            raise ValueError(f"The online migration of '{table_name}' would lose the data of renamed columns; "
+                             f"migrate it with a plain ALTER TABLE")
+        pk = get_primary_key_column(cursor, table_name)
+        if pk is None:
+            raise ValueError(f"Table '{table_name}' needs a single-column primary key for an online migration")
+        foreign_keys = get_foreign_key_links(cursor, table_name)
+        if foreign_keys:
+            raise ValueError(f"Table '{table_name}' has or is referenced by foreign keys "
+                             f"({', '.join(foreign_keys)}), which an online migration would lose; "
+                             f"migrate it with a plain ALTER TABLE")
+
+        cursor.execute(f"DROP TABLE IF EXISTS `{shadow_name}`")  # Left over from an interrupted run
+        cursor.execute(f"CREATE TABLE `{shadow_name}` LIKE `{table_name}`")
+        cursor.execute(f"ALTER TABLE `{shadow_name}` {ONLINE_DDL_OPTION.sub('', alter_clauses)}")
+
+        columns = get_copy_columns(cursor, table_name, shadow_name)
+        column_list = ', '.join(f"`{column}`" for column in columns)
+        new_values = ', '.join(f"NEW.`{column}`" for column in columns)
+
+        # Keep the shadow table in step with writes that happen during the copy
+        cursor.execute(f"""
+            CREATE TRIGGER `{triggers[0]}` AFTER INSERT ON `{table_name}` FOR EACH ROW
+            REPLACE INTO `{shadow_name}` ({column_list}) VALUES ({new_values})
+        """)
+        cursor.execute(f"""
+            CREATE TRIGGER `{triggers[1]}` AFTER UPDATE ON `{table_name}` FOR EACH ROW
+            BEGIN
+                DELETE IGNORE FROM `{shadow_name}` WHERE `{pk}` = OLD.`{pk}` AND NOT (OLD.`{pk}` <=> NEW.`{pk}`);
+                REPLACE INTO `{shadow_name}` ({column_list}) VALUES ({new_values});
+            END
+        """)
+        cursor.execute(f"""
+            CREATE TRIGGER `{triggers[2]}` AFTER DELETE ON `{table_name}` FOR EACH ROW
+            DELETE IGNORE FROM `{shadow_name}` WHERE `{pk}` = OLD.`{pk}`
+        """)
+
+        copied = 0
+        lower = None
+        started = time.time()
+        while True:
+            lower_filter = f"WHERE `{pk}` > %s" if lower is not None else ""
+            params = (lower,) if lower is not None else ()
+            cursor.execute(f"SELECT MAX(`{pk}`) FROM (SELECT `{pk}` FROM `{table_name}` {lower_filter} "
+                           f"ORDER BY `{pk}` LIMIT {int(chunk_rows)}) AS chunk", params)
+            upper = cursor.fetchone()[0]
+            if upper is None:
+                break
+
+            chunk_started = time.time()
+            range_filter = f"`{pk}` > %s AND `{pk}` <= %s" if lower is not None else f"`{pk}` <= %s"
+            cursor.execute(f"INSERT LOW_PRIORITY IGNORE INTO `{shadow_name}` ({column_list}) "
+                           f"SELECT {column_list} FROM `{table_name}` FORCE INDEX (PRIMARY) "
+                           f"WHERE {range_filter} LOCK IN SHARE MODE", params + (upper,))
+            elapsed = time.time() - chunk_started
+            copied += cursor.rowcount
+            lower = upper
+
+            # Move the chunk size towards chunk_time, without jumping more than 2x per chunk
+            ratio = chunk_time / max(elapsed, 0.001)
+            chunk_rows = int(max(100, min(chunk_rows * min(max(ratio, 0.5), 2.0), 100000)))
+
+            wait_for_capacity(cursor, replica_cursor, max_replica_lag, max_threads_running)
+
+        print(f"Copied {copied} rows of '{table_name}' in {time.time() - started:.1f}s")
+
+        cursor.execute(f"DROP TABLE IF EXISTS `{old_name}`")
+        cursor.execute(f"RENAME TABLE `{table_name}` TO `{old_name}`, `{shadow_name}` TO `{table_name}`")
+    except (Error, ValueError):
+        # Leave the original table as it was
+        for trigger in triggers:
+            try:
+                cursor.execute(f"DROP TRIGGER IF EXISTS `{trigger}`")
+            except Error:
+                pass
+        try:
+            cursor.execute(f"DROP TABLE IF EXISTS `{shadow_name}`")
+        except Error:
+            pass
+        cursor.close()
+        raise
+    finally:
+        if replica_cursor is not None:
+            replica_cursor.close()
+
+    # The altered table is in place; from here on errors must not mark the migration as failed
+    try:
+        for trigger in triggers:
+            cursor.execute(f"DROP TRIGGER IF EXISTS `{trigger}`")
+        if drop_old_table:
+            cursor.execute(f"DROP TABLE IF EXISTS `{old_name}`")
+        print(f"Online migration of '{table_name}' finished")
+    except Error as e:
+        print(f"Online migration of '{table_name}' finished, but cleaning up failed: {e}. "
+              f"Drop the triggers {', '.join(triggers)}{f' and the table {old_name}' if drop_old_table else ''} "
+              f"by hand.")
+    finally:
+        cursor.close()
+
+def execute_migration_statements(connection, statements, online_tables=(), batch_size=1000,
+                                 batch_bytes=16 * 1024 * 1024, bulk_session=False, **online_options):
+    """Execute statements like execute_statements, running ALTER TABLE on online_tables through online_alter_table.
+
+    Returns the number of statements executed.
+    """
+    def online_alter(statement):
+        match = ALTER_TABLE.match(statement)
+        return match if match and match.group(1) in online_tables else None
+
+    executed = 0
+    for is_online, group in groupby(statements, key=lambda statement: online_alter(statement) is not None):
+        if is_online:
+            for statement in group:
+                match = online_alter(statement)
+                online_alter_table(connection, match.group(1), match.group(2), **online_options)
+                executed += 1
+        else:
+            executed += execute_statements(connection, group, batch_size, batch_bytes, bulk_session)
+    return executed
+
+def ensure_migration_ledger(connection, ledger_table='schema_migrations'):
+    """Create the table recording applied migration files if it does not exist yet."""
+    cursor = connection.cursor()
+    try:
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS `{ledger_table}` (
+                `filename` varchar(255) NOT NULL PRIMARY KEY,
+                `checksum` char(64) NOT NULL,
+                `status` varchar(16) NOT NULL,
+                `statements` int NOT NULL DEFAULT 0,
+                `duration_ms` int NOT NULL DEFAULT 0,
+                `applied_at` datetime NOT NULL DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+    finally:
+        cursor.close()
+
+def load_migration_ledger(connection, ledger_table='schema_migrations'):
+    """Return {filename: (checksum, status)} for every migration recorded in the ledger, in one query."""
+    cursor = connection.cursor()
+    try:
+        cursor.execute(f"SELECT `filename`, `checksum`, `status` FROM `{ledger_table}`")
+        return {filename: (checksum, status) for filename, checksum, status in cursor.fetchall()}
+    finally:
+        cursor.close()
+
+def record_migration(connection, filename, checksum, status, statements, duration_ms,
+                     ledger_table='schema_migrations'):
+    """Insert or update the ledger row of a migration file."""
+    cursor = connection.cursor()
+    try:
+        cursor.execute(f"""
+            INSERT INTO `{ledger_table}` (`filename`, `checksum`, `status`, `statements`, `duration_ms`, `applied_at`)
+            VALUES (%s, %s, %s, %s, %s, NOW())
+            ON DUPLICATE KEY UPDATE `checksum` = VALUES(`checksum`), `status` = VALUES(`status`),
+                                    `statements` = VALUES(`statements`), `duration_ms` = VALUES(`duration_ms`),
+                                    `applied_at` = VALUES(`applied_at`)
+        """, (filename, checksum, status, statements, duration_ms))
+        connection.commit()
+    finally:
+        cursor.close()
+
+def file_checksum(file_path):
+    """Return the SHA-256 of a file's content, read in 1 MB blocks."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def execute_sql_files(connection, directory, batch_size=1000, batch_bytes=16 * 1024 * 1024, bulk_session=False,
+                      online_tables=(), ledger_table='schema_migrations', **online_options):
+    """Apply the pending migration files of a directory in filename (timestamp) order.
+
+    Applied files are recorded in ledger_table with their checksum, statement count, duration and
+    status, and skipped on later runs. Nothing is applied if a file recorded as applied has changed
+    since. Applying stops at the first failing file, which is recorded as failed and retried next time.
+    Returns 'applied', 'up to date', 'changed' (refused) or 'failed'.
+    """
+    ensure_migration_ledger(connection, ledger_table)
+    ledger = load_migration_ledger(connection, ledger_table)
+
+    pending = []
+    changed = []
+    for filename in sorted(os.listdir(directory)):
+        if filename.endswith(SQL_FILE_SUFFIXES):
             file_path = os.path.join(directory, filename)
-            with open(file_path, 'r', encoding='utf-8') as file:
-                sql_commands = file.read()
-                # Split commands by semicolon, but handle multi-line statements
-                commands = sql_commands.split(';')
+            checksum = file_checksum(file_path)
+            recorded = ledger.get(filename)
+            if recorded is None or recorded[1] != 'applied':
+                pending.append((filename, file_path, checksum))
+            elif recorded[0] != checksum:
+                changed.append(filename)
+
+    if changed:
+        print(f"Refusing to migrate: already applied files have changed: {', '.join(changed)}")
+        return 'changed'
+    if not pending:
+        print("No pending migrations.")
+        return 'up to date'
+
+    for filename, file_path, checksum in pending:
+        with open_sql_file(file_path) as file:
+            started = time.time()
+            # Statements are read one at a time, so the file never has to fit in memory
+            try:
+                executed = execute_migration_statements(connection, iter_sql_statements(file), online_tables,
+                                                        batch_size, batch_bytes, bulk_session, **online_options)
+                record_migration(connection, filename, checksum, 'applied', executed,
+                                 int((time.time() - started) * 1000), ledger_table)
+                print(f"All {executed} commands from {filename} executed successfully.")
+            except (Error, ValueError) as e:
+                print(f"Error executing commands from {filename}. Rolled back the failed batch.")
+                print(f"The error '{e}' occurred")
                 try:
-                    for command in commands:
-                        command = command.strip()
-                        if command:  # Avoid executing empty commands
-                            execute_query(connection, command)
-                    connection.commit()  # Commit all commands if successful
-                    print(f"All commands from {filename} executed successfully.")
-                except Error as e:
-                    print(f"Error executing commands from {filename}. Rolling back.")
-                    connection.rollback()  # Rollback on error
-                    print(f"The error '{e}' occurred")
+                    record_migration(connection, filename, checksum, 'failed', 0,
+                                     int((time.time() - started) * 1000), ledger_table)
+                except Error as ledger_error:
+                    print(f"Could not record the failure in the ledger: {ledger_error}")
+                print("Stopped, later migrations may depend on this one.")
+                return 'failed'
+    return 'applied'
+
+def list_fleet_databases(connection, databases):
+    """Resolve a list of database names and glob patterns (e.g. 'tenant_*') against the server."""
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SHOW DATABASES")
+        existing = [name for (name,) in cursor.fetchall()]
+    finally:
+        cursor.close()
+    return [name for name in existing if any(fnmatch.fnmatchcase(name, pattern) for pattern in databases)]
+
+def migrate_fleet(host_name, user_name, user_password, databases, directory, concurrency=8, timeout=600,
+                  max_failures=None, replica_params=None, **options):
+    """Apply pending migrations to many databases at once, isolating failures per database.
+
+    databases is a list of names and glob patterns. At most `concurrency` databases are migrated
+    at the same time, each over its own connection. Any error while migrating a database only
+    fails that database. A database still running after `timeout` seconds has its connection
+    killed from a control connection and counts as failed. Once max_failures databases have
+    failed, the ones not started yet are skipped. options are passed on to execute_sql_files;
+    instead of a replica_connection, which the worker threads cannot share, pass replica_params
+    (create_connection arguments) to open one replica connection per database.
+    Returns {database: status} and prints a summary.
+    """
+    if options.get('replica_connection') is not None:
+        raise ValueError("A connection cannot be shared between fleet workers, pass replica_params instead")
+    options.pop('replica_connection', None)
+    control = create_connection(host_name, user_name, user_password)
+    if control is None:
+        print("Failed to connect to the MySQL server.")
+        return {}
+    names = list_fleet_databases(control, databases)
+    print(f"Migrating {len(names)} databases, {concurrency} at a time")
+
+    results = {}
+    running = {}  # database -> (connection id, start time), set by the worker once connected
+    killed = set()
+    lock = threading.Lock()
+
+    def migrate_one(name):
+        with lock:
+            if max_failures is not None and sum(status in ('changed', 'failed', 'timed out')
+                                                for status in results.values()) >= max_failures:
+                return 'skipped'
+        connection = create_connection(host_name, user_name, user_password)
+        if connection is None:
+            return 'failed'
+        replica_connection = None
+        try:
+            if replica_params is not None:
+                replica_connection = create_connection(**replica_params)
+                if replica_connection is None:
+                    return 'failed'  # Copying without watching the replica could overload it
+            connection.database = name
+            with lock:
+                running[name] = (connection.connection_id, time.time())
+            return execute_sql_files(connection, directory, replica_connection=replica_connection, **options)
+        except Exception as e:  # Whatever goes wrong, it must not stop the other databases
+            print(f"[{name}] The error '{e}' occurred")
+            return 'failed'
+        finally:
+            with lock:
+                running.pop(name, None)
+            if connection.is_connected():
+                connection.close()
+            if replica_connection is not None and replica_connection.is_connected():
+                replica_connection.close()
+
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = {executor.submit(migrate_one, name): name for name in names}
+            while futures:
+                finished, _ = wait(futures, timeout=1, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = futures.pop(future)
+                    status = future.result()
+                    if name in killed:
+                        status = 'timed out'
+                    with lock:
+                        results[name] = status
+                    print(f"[{len(results)}/{len(names)}] {name}: {status}")
+
+                # Kill the connections of databases that ran past their timeout
+                with lock:
+                    overdue = [(name, connection_id) for name, (connection_id, started) in running.items()
+                               if time.time() - started > timeout and name not in killed]
+                for name, connection_id in overdue:
+                    killed.add(name)
+                    print(f"[{name}] Timed out after {timeout}s, killing connection {connection_id}")
+                    cursor = control.cursor()
+                    try:
+                        cursor.execute(f"KILL {int(connection_id)}")
+                    except Error as e:
+                        print(f"[{name}] Could not kill connection {connection_id}: {e}")
+                    finally:
+                        cursor.close()
+    finally:
+        if control.is_connected():
+            control.close()
+
+    print("Fleet migration summary:")
+    for status in ('applied', 'up to date', 'skipped', 'changed', 'failed', 'timed out'):
+        selected = sorted(name for name, result in results.items() if result == status)
+        if selected:
+            print(f"  {status}: {len(selected)} ({', '.join(selected[:20])}{', ...' if len(selected) > 20 else ''})")
+    return results
 
 # Connection parameters
 host = "localhost"
 user = "root"  # Change to your MySQL username
 password = ""  # Change to your MySQL password
 db_name = ""  # Change to your database name
+fleet_databases = []  # Names or patterns of databases to migrate together instead of db_name, e.g. ['tenant_*']
+fleet_concurrency = 8  # Databases migrated at the same time
+fleet_timeout = 600  # Seconds before a database's migration is killed
+batch_size = 1000  # Statements per transaction when applying SQL files
+bulk_session = False  # Set to True to disable unique_checks and foreign_key_checks while loading
+online_tables = set()  # Tables whose ALTER TABLE is applied by copying into a shadow table, e.g. {'orders'}
+online_options = {
+    "chunk_time": 0.5,  # Seconds each copy chunk should take
+    "max_replica_lag": 5,  # Pause copying while the replica is further behind, in seconds
+    "max_threads_running": 50,  # Pause copying while the server is busier
+    "drop_old_table": False,  # Set to True to drop the original table once the altered one is in place
+    "replica_connection": None  # Connection to a replica to watch, e.g. create_connection(...)
+}
+replica_params = None  # For fleet migrations, e.g. {"host_name": "replica", "user_name": user, "user_password": password}
 
-# Create a connection without specifying the database
-conn = create_connection(host, user, password)
+if __name__ == "__main__" and fleet_databases:
+    migrate_fleet(host, user, password, fleet_databases, os.path.join(os.getcwd(), 'sql/migration'),
+                  fleet_concurrency, fleet_timeout, batch_size=batch_size, bulk_session=bulk_session,
+                  replica_params=replica_params, online_tables=online_tables, **online_options)
+elif __name__ == "__main__":
+    # Create a connection without specifying the database
+    conn = create_connection(host, user, password)
 
-# Create the database if it doesn't exist
-if conn is not None:
-    create_database(conn, db_name)
+    # Create the database if it doesn't exist
+    if conn is not None:
+        create_database(conn, db_name)
 
-    # Now connect to the new database
-    conn.database = db_name
+        # Now connect to the new database
+        conn.database = db_name
 
-    # Directory containing SQL files
-    sql_directory = os.path.join(os.getcwd(), 'sql/migration')  # Change 'sql_for_test' to your directory name
+        # Directory containing SQL files
+        sql_directory = os.path.join(os.getcwd(), 'sql/migration')  # Change 'sql_for_test' to your directory name
 
-    # Execute SQL files
-    execute_sql_files(conn, sql_directory)
+        # Execute SQL files
+        execute_sql_files(conn, sql_directory, batch_size, bulk_session=bulk_session, online_tables=online_tables,
+                          **online_options)
 
-    # Close the connection
-    if conn.is_connected():
-        conn.close()
-        print("MySQL connection is closed")
-else:
-    print("Failed to connect to the MySQL server.")
\ No newline at end of file
+        # Close the connection
+        if conn.is_connected():
+            conn.close()
+            print("MySQL connection is closed")
+    else:
+        print("Failed to connect to the MySQL server.")
\ No newline at end of file
@@ -0,0 +1,368 @@
+from mysql.connector import Error
+import os
+import re
+from datetime import datetime
+
+from alter import ALGORITHM_COST, classify_add_column
+from sql_mirgate import create_connection
+from sql_statements import SQL_FILE_SUFFIXES, iter_sql_statements, open_sql_file
+
+# Define the base directory for the project
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))  # This can be set to a different path if needed
+
+TABLE_STATEMENT = re.compile(r"\s*(ALTER|CREATE|DROP|RENAME)\s+TABLE\s+(?:IF\s+(?:NOT\s+)?EXISTS\s+)?`?([\w$]+)`?",
+                             re.IGNORECASE)
+CREATE_INDEX = re.compile(r"\s*CREATE\s+(?:UNIQUE\s+|FULLTEXT\s+|SPATIAL\s+)?INDEX\s+\S+\s+ON\s+`?([\w$]+)`?",
+                          re.IGNORECASE)
+REFERENCES = re.compile(r"REFERENCES\s+`?([\w$]+)`?", re.IGNORECASE)
+# Other tables a statement reads or writes, so statements on the same table keep their order
+DML_TABLE = re.compile(r"\s*(?:(?:INSERT|REPLACE)(?:\s+(?:LOW_PRIORITY|DELAYED|HIGH_PRIORITY|IGNORE))*(?:\s+INTO)?"
+                       r"|UPDATE(?:\s+(?:LOW_PRIORITY|IGNORE))*|DELETE(?:\s+(?:LOW_PRIORITY|QUICK|IGNORE))*\s+FROM"
+                       r"|TRUNCATE(?:\s+TABLE)?)\s+`?([\w$]+)`?", re.IGNORECASE)
+SOURCE_TABLE = re.compile(r"\b(?:FROM|JOIN)\s+`?([\w$]+)`?", re.IGNORECASE)
+LISTED_TABLE = re.compile(r"(?:\bTO|,)\s+`?([\w$]+)`?", re.IGNORECASE)
+ALTER_RENAME = re.compile(r"\bRENAME\s+(?:TO|AS)\s+`?([\w$]+)`?", re.IGNORECASE)
+# Statements that only change the session, written to every file of a split plan
+SESSION_STATEMENT = re.compile(r"\s*(?:/\*!\d*\s*)?(?:SET|USE)\b", re.IGNORECASE)
+
+# Work an InnoDB operation does on the table: nothing, build one index, or rebuild every row
+WORK_NONE, WORK_INDEX, WORK_REBUILD = 'none', 'index', 'rebuild'
+
+def split_clauses(body):
+    """Split the clause list of an ALTER TABLE on the commas that are not inside parentheses or quotes."""
+    clauses = []
+    depth = 0
+    quote = None
+    start = 0
+    i = 0
+    while i < len(body):
+        char = body[i]
+        if quote:
+            if char == '\\':
+                i += 1
+            elif char == quote:
+                quote = None
+        elif char in "'\"`":
+            quote = char
+        elif char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif char == ',' and depth == 0:
+            clauses.append(body[start:i].strip())
+            start = i + 1
+        i += 1
+    clauses.append(body[start:].strip())
+    return [clause for clause in clauses if clause]
+
+def classify_clause(clause):
+    """Return (algorithm, work) for one ALTER TABLE clause, the cheapest InnoDB can do it with."""
+    upper = ' '.join(clause.upper().split())
+    if upper.startswith('ADD COLUMN') or (upper.startswith('ADD ') and not re.match(
+            r"ADD (UNIQUE |FULLTEXT |SPATIAL |PRIMARY )?(INDEX|KEY|CONSTRAINT|FOREIGN)", upper)):
+        algorithm = classify_add_column(clause)
+        return algorithm, WORK_NONE if algorithm == 'INSTANT' else WORK_REBUILD
+    if re.match(r"ADD (FULLTEXT|SPATIAL) ", upper):
+        return 'COPY', WORK_INDEX  # Built in place, but writes are blocked while it runs
+    if re.match(r"ADD PRIMARY KEY", upper):
+        return 'INPLACE', WORK_REBUILD
+    if re.match(r"ADD (UNIQUE )?(INDEX|KEY)", upper):
+        return 'INPLACE', WORK_INDEX
+    if upper.startswith('ADD CONSTRAINT') or upper.startswith('ADD FOREIGN KEY'):
+        return 'COPY', WORK_REBUILD  # Only in place with foreign_key_checks off
+    if re.match(r"DROP (INDEX|KEY|FOREIGN KEY)", upper) or upper.startswith('RENAME INDEX'):
+        return 'INPLACE', WORK_NONE
+    if re.match(r"ALTER COLUMN \S+ (SET|DROP) DEFAULT", upper) or upper.startswith('RENAME COLUMN'):
+        return 'INSTANT', WORK_NONE
+    if upper.startswith('DROP COLUMN') or upper.startswith('DROP '):
+        return 'INPLACE', WORK_REBUILD
+    if upper.startswith('ROW_FORMAT') or upper.startswith('FORCE'):
+        return 'INPLACE', WORK_REBUILD
+    # MODIFY/CHANGE COLUMN, ENGINE and anything else unknown: assume the table is copied
+    return 'COPY', WORK_REBUILD
+
+def classify_statement(statement):
+    """Classify a migration statement.
+
+    Returns a dict with the statement type, table, algorithm (INSTANT/INPLACE/COPY), the work
+    done on the table and the tables it references through new foreign keys.
+    """
+    plan = {"statement": statement, "type": 'OTHER', "table": None, "algorithm": 'COPY', "work": WORK_REBUILD,
+            "references": set(REFERENCES.findall(statement))}
+    match = TABLE_STATEMENT.match(statement)
+    if match is None:
+        index = CREATE_INDEX.match(statement)
+        dml = DML_TABLE.match(statement)
+        if index:
+            plan.update(type='CREATE INDEX', table=index.group(1), algorithm='INPLACE', work=WORK_INDEX)
+            plan['tables'] = {index.group(1)}
+        elif dml:
+            plan['tables'] = {dml.group(1)} | set(SOURCE_TABLE.findall(statement))
+        elif SESSION_STATEMENT.match(statement):
+            plan.update(type='SESSION', algorithm='INSTANT', work=WORK_NONE)
+        return plan
+
+    plan['type'] = f"{match.group(1).upper()} TABLE"
+    plan['table'] = match.group(2)
+    plan['tables'] = {plan['table']} | plan['references']
+    if plan['type'] in ('RENAME TABLE', 'DROP TABLE'):
+        # RENAME TABLE a TO b, c TO d and DROP TABLE a, b touch every table they name
+        plan['tables'] |= set(LISTED_TABLE.findall(statement[match.end():]))
+    elif plan['type'] == 'ALTER TABLE':
+        plan['tables'] |= set(ALTER_RENAME.findall(statement[match.end():]))
+    if plan['type'] != 'ALTER TABLE':
+        # New, dropped and renamed tables do not touch any rows
+        plan.update(algorithm='INSTANT', work=WORK_NONE)
+        return plan
+
+    explicit = None
+    clauses = []
+    for clause in split_clauses(statement[match.end():].rstrip().rstrip(';')):
+        option = re.match(r"(ALGORITHM|LOCK)\s*=\s*(\w+)", clause, re.IGNORECASE)
+        if option:
+            if option.group(1).upper() == 'ALGORITHM' and option.group(2).upper() in ALGORITHM_COST:
+                explicit = option.group(2).upper()
+            continue
+        clauses.append(classify_clause(clause))
+
+    if clauses:
+        plan['algorithm'] = max((algorithm for algorithm, _ in clauses), key=ALGORITHM_COST.index)
+        works = [work for _, work in clauses]
+        plan['work'] = WORK_REBUILD if WORK_REBUILD in works else WORK_INDEX if WORK_INDEX in works else WORK_NONE
+        plan['index_builds'] = works.count(WORK_INDEX)
+    if explicit:
+        plan['algorithm'] = explicit  # The server refuses the statement rather than fall back to something slower
+    return plan
+
+def get_table_sizes(cursor, table_names):
+    """Read row count estimates, data and index sizes and the number of secondary indexes per table."""
+    if not table_names:
+        return {}
+    placeholders = ', '.join(['%s'] * len(table_names))
+    cursor.execute(f"""
+        SELECT t.TABLE_NAME, IFNULL(t.TABLE_ROWS, 0), IFNULL(t.DATA_LENGTH, 0), IFNULL(t.INDEX_LENGTH, 0),
+               (SELECT COUNT(DISTINCT s.INDEX_NAME) FROM INFORMATION_SCHEMA.STATISTICS s
+                 WHERE s.TABLE_SCHEMA = t.TABLE_SCHEMA AND s.TABLE_NAME = t.TABLE_NAME
+                   AND s.INDEX_NAME <> 'PRIMARY')
+        FROM INFORMATION_SCHEMA.TABLES t
+        WHERE t.TABLE_SCHEMA = DATABASE() AND t.TABLE_NAME IN ({placeholders})
+    """, tuple(table_names))
+    return {table_name: {"rows": int(rows), "data_length": int(data_length), "index_length": int(index_length),
+                         "indexes": int(indexes)}
+            for table_name, rows, data_length, index_length, indexes in cursor.fetchall()}
+
+def estimate_cost(plan, size, io_rate):
+    """Estimate the bytes read and written by a statement and how long it takes at io_rate bytes per second.
+
+    A rebuild reads and writes the whole table with its indexes, a copy also re-inserts every row
+    through the SQL layer (counted as twice the time). An index build scans the data and writes
+    one more index, sized like the average existing secondary index (a quarter of the data if there is none).
+    """
+    data, index = size['data_length'], size['index_length']
+    if plan['work'] == WORK_REBUILD:
+        io_bytes = 2 * (data + index)
+    elif plan['work'] == WORK_INDEX:
+        index_size = index // size['indexes'] if size['indexes'] else data // 4
+        io_bytes = plan.get('index_builds', 1) * (data + index_size)
+    else:
+        io_bytes = 0
+    seconds = io_bytes / io_rate
+    if plan['algorithm'] == 'COPY':
+        seconds *= 2
+    plan.update(rows=size['rows'], data_length=data, index_length=index, io_bytes=io_bytes, seconds=seconds)
+    return plan
+
+def depends_on(later, earlier):
+    """Check whether a statement has to stay after an earlier one of the file.
+
+    Statements on a common table keep their order. Statements without a known table, other than
+    session statements, are barriers that nothing is moved across.
+    """
+    if later['type'] == 'SESSION' or earlier['type'] == 'SESSION':
+        return False
+    if 'tables' not in later or 'tables' not in earlier:
+        return True
+    return bool(later['tables'] & earlier['tables'])
+
+def order_plans(plans):
+    """Order statements cheapest first: new tables, then by estimated time and algorithm, and new foreign keys last.
+
+    A statement only moves ahead of earlier ones it does not depend on (see depends_on), and session
+    statements such as SET and USE keep their place between the statements around them, so the
+    original order is kept wherever it matters. Foreign keys may need an index or a table created
+    by another statement, so statements adding them wait until nothing else can run. The original
+    order is kept between statements that cost the same.
+    """
+    def cost(index):
+        plan = plans[index]
+        group = 0 if plan['type'] == 'CREATE TABLE' else 2 if plan['references'] else 1
+        return group, plan['seconds'], ALGORITHM_COST.index(plan['algorithm']), index
+
+    ordered = []
+    segment = []
+
+    def schedule():
+        # Repeatedly take the cheapest statement whose earlier dependencies have all been placed
+        waiting_for = {i: {j for j in segment if j < i and depends_on(plans[i], plans[j])} for i in segment}
+        followers = {i: [k for k in segment if i in waiting_for[k]] for i in segment}
+        ready = [i for i in segment if not waiting_for[i]]
+        while ready:
+            chosen = min(ready, key=cost)
+            ready.remove(chosen)
+            ordered.append(plans[chosen])
+            for k in followers[chosen]:
+                waiting_for[k].discard(chosen)
+                if not waiting_for[k]:
+                    ready.append(k)
+        segment.clear()
+
+    for index, plan in enumerate(plans):
+        if plan['type'] == 'SESSION':
+            schedule()
+            ordered.append(plan)
+        else:
+            segment.append(index)
+    schedule()
+    return ordered
+
+def split_plans(plans):
+    """Assign ordered statements to the INSTANT, INPLACE and COPY files of a split plan.
+
+    A statement goes to the file of its algorithm, or to a later one when a statement it depends on
+    is there, so running the files in order keeps every dependency. Session statements are copied
+    into every file at their place.
+    """
+    files = {algorithm: [] for algorithm in ALGORITHM_COST}
+    placed = []  # (plan, file index)
+    for plan in plans:
+        if plan['type'] == 'SESSION':
+            for selected in files.values():
+                selected.append(plan)
+            continue
+        number = max([ALGORITHM_COST.index(plan['algorithm'])] +
+                     [earlier_number for earlier, earlier_number in placed if depends_on(plan, earlier)])
+        placed.append((plan, number))
+        files[ALGORITHM_COST[number]].append(plan)
+    # A file holding only session statements has nothing to run
+    return {algorithm: selected for algorithm, selected in files.items()
+            if any(plan['type'] != 'SESSION' for plan in selected)}
+
+def format_size(num_bytes):
+    """Format a byte count for the report."""
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if num_bytes < 1024:
+            return f"{num_bytes:.1f} {unit}"
+        num_bytes /= 1024
+    return f"{num_bytes:.1f} TB"
+
+def format_duration(seconds):
+    """Format a duration estimate for the report."""
+    if seconds < 60:
+        return f"{seconds:.0f}s"
+    if seconds < 3600:
+        return f"{seconds / 60:.1f}m"
+    return f"{seconds / 3600:.1f}h"
+
+def build_report(migration_file, plans):
+    """Build the plan report, one line per statement in execution order plus totals."""
+    lines = [f"Migration plan for {migration_file}",
+             f"Generated {datetime.now().isoformat()}",
+             "",
+             f"{'#':>3}  {'algorithm':<9}  {'work':<7}  {'table':<30}  {'rows':>12}  {'data':>10}  "
+             f"{'indexes':>10}  {'est. I/O':>10}  {'est. time':>9}  statement"]
+    for number, plan in enumerate(plans, 1):
+        summary = ' '.join(plan['statement'].split())
+        lines.append(f"{number:>3}  {plan['algorithm']:<9}  {plan['work']:<7}  {str(plan['table']):<30}  "
+                     f"{plan['rows']:>12}  {format_size(plan['data_length']):>10}  "
+                     f"{format_size(plan['index_length']):>10}  {format_size(plan['io_bytes']):>10}  "
+                     f"{format_duration(plan['seconds']):>9}  {summary[:80]}")
+
+    lines.append("")
+    for algorithm in ALGORITHM_COST:
+        selected = [plan for plan in plans if plan['algorithm'] == algorithm]
+        if selected:
+            lines.append(f"{algorithm}: {len(selected)} statements, "
+                         f"{format_size(sum(plan['io_bytes'] for plan in selected))} I/O, "
+                         f"{format_duration(sum(plan['seconds'] for plan in selected))}")
+    lines.append(f"Total: {len(plans)} statements, {format_size(sum(plan['io_bytes'] for plan in plans))} I/O, "
+                 f"{format_duration(sum(plan['seconds'] for plan in plans))}")
+    return '\n'.join(lines) + '\n'
+
+def write_statements(file_path, plans):
+    """Write planned statements to a SQL file."""
+    with open(file_path, 'w', encoding='utf-8') as f:
+        for plan in plans:
+            f.write(plan['statement'].rstrip().rstrip(';') + ';\n')
+
+def plan_migration(connection, migration_file, output_dir, io_rate=100 * 1024 * 1024, split=False):
+    """Dry-run a migration file: classify, estimate and reorder its statements without executing any of them.
+
+    Writes <name>.plan.txt and the reordered <name>.sql to output_dir, or with split, one file per
+    algorithm (<name>.1_instant.sql, <name>.2_inplace.sql, <name>.3_copy.sql) to run in that order;
+    see split_plans.
+    Returns the ordered plans.
+    """
+    with open_sql_file(migration_file) as file:
+        plans = [classify_statement(statement) for statement in iter_sql_statements(file)]
+
+    cursor = connection.cursor()
+    try:
+        sizes = get_table_sizes(cursor, sorted({plan['table'] for plan in plans if plan['table']}))
+    finally:
+        cursor.close()
+
+    empty = {"rows": 0, "data_length": 0, "index_length": 0, "indexes": 0}  # Tables that do not exist yet
+    for plan in plans:
+        estimate_cost(plan, sizes.get(plan['table'], empty), io_rate)
+    plans = order_plans(plans)
+
+    os.makedirs(output_dir, exist_ok=True)
+    name = os.path.basename(migration_file).split('.sql')[0]
+    report = build_report(migration_file, plans)
+    with open(os.path.join(output_dir, f"{name}.plan.txt"), 'w', encoding='utf-8') as f:
+        f.write(report)
+    print(report)
+
+    if split:
+        files = split_plans(plans)
+        for number, algorithm in enumerate(ALGORITHM_COST, 1):
+            if algorithm in files:
+                write_statements(os.path.join(output_dir, f"{name}.{number}_{algorithm.lower()}.sql"),
+                                 files[algorithm])
+    else:
+        write_statements(os.path.join(output_dir, f"{name}.sql"), plans)
+    print(f"Plan written to '{output_dir}'.")
+    return plans
+
+def main():
+    host = "localhost"
+    user = "root"  # Change to your MySQL username
+    password = ""  # Change to your MySQL password
+    db_name = ""  # Database the migration will run against
+    migration_dir = os.path.join(BASE_DIR, 'sql/migration')
+    output_dir = os.path.join(BASE_DIR, 'sql/plan')  # Kept out of sql/migration so the plan is not applied twice
+    io_rate = 100 * 1024 * 1024  # Bytes per second the server can read and write during a rebuild
+    split = False  # Set to True to write one file per algorithm
+
+    migration_files = sorted(filename for filename in os.listdir(migration_dir) if filename.endswith(SQL_FILE_SUFFIXES))
+    if not migration_files:
+        print(f"No migration files in '{migration_dir}'.")
+        return
+
+    conn = create_connection(host, user, password)
+    if conn is None:
+        print("Failed to connect to the MySQL server.")
+        return
+    try:
+        conn.database = db_name
+        # Plan the latest generated migration
+        plan_migration(conn, os.path.join(migration_dir, migration_files[-1]), output_dir, io_rate, split)
+    except Error as e:
+        print(f"The error '{e}' occurred")
+    finally:
+        if conn.is_connected():
+            conn.close()
+            print("MySQL connection is closed")
+
+if __name__ == "__main__":
+    main()
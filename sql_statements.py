@@ -0,0 +1,259 @@
+from mysql.connector import Error
+import gzip
+import io
+import re
+
+try:
+    import zstandard
+except ImportError:  # Only needed for .sql.zst files
+    zstandard = None
+
+# Tokens the statement splitter has to look at: quotes and comment starts
+SQL_SPECIAL = re.compile(r"['\"`#]|--|/\*")
+QUOTE_END = {"'": re.compile(r"['\\]"), '"': re.compile(r'["\\]'), '`': re.compile(r'`')}
+QUOTED = {"'": re.compile(r"'(?:[^'\\]|\\.|'')*'", re.DOTALL),
+          '"': re.compile(r'"(?:[^"\\]|\\.|"")*"', re.DOTALL),
+          '`': re.compile(r'`(?:[^`]|``)*`')}
+# Plain text and complete quoted literals up to the next ';' or comment, matched in one go
+PLAIN_RUN = re.compile(r"""(?:[^'"`#/;-]++|/(?!\*)|-(?!-)|'(?:[^'\\]++|\\.|'')*+'|"(?:[^"\\]++|\\.|"")*+"|`(?:[^`]++|``)*+`)++""",
+                       re.DOTALL)
+LEADING_SPACE = re.compile(r'\s*')
+DELIMITER_COMMAND = re.compile(r'DELIMITER[ \t]+(\S+)', re.IGNORECASE)
+SQL_FILE_SUFFIXES = ('.sql', '.sql.gz', '.sql.zst')  # Plain and compressed SQL files
+
+def open_sql_file(file_path):
+    """Open a .sql, .sql.gz or .sql.zst file as text, decompressing it while it is read."""
+    if file_path.endswith('.gz'):
+        return gzip.open(file_path, 'rt', encoding='utf-8')
+    if file_path.endswith('.zst'):
+        if zstandard is None:
+            raise ImportError("Reading .zst files needs the zstandard package")
+        reader = zstandard.ZstdDecompressor().stream_reader(open(file_path, 'rb'), closefd=True)
+        return io.TextIOWrapper(reader, encoding='utf-8')
+    return open(file_path, 'r', encoding='utf-8')
+
+def iter_sql_statements(file, chunk_size=1024 * 1024):
+    """Yield complete SQL statements from a file object, reading it in chunks.
+
+    Semicolons inside quotes, backticks and comments do not end a statement, plain comments are
+    dropped (/*! ... */ and /*+ ... */ are kept since the server reads them), and DELIMITER lines
+    change the statement terminator the way the mysql client does.
+    """
+    delimiter = ';'
+    parts = []  # Pieces of the statement being built
+    buf = ''
+    pos = 0
+    eof = False
+    need_more = False
+    state = None  # None, a quote character, '--' for line comments, '/*' or '/*!' for block comments
+    special = None  # Next quote or comment start in buf, reused until pos moves past it
+    special_stale = True
+
+    while True:
+        if need_more or pos >= len(buf):
+            if eof:
+                if pos >= len(buf):
+                    break
+            else:
+                chunk = file.read(chunk_size)
+                eof = not chunk
+                buf = buf[pos:] + chunk
+                pos = 0
+                special_stale = True
+            need_more = False
+            continue
+
+        if state is None:
+            if not any(part.strip() for part in parts):
+                # At the start of a statement: look for a DELIMITER command
+                start = LEADING_SPACE.match(buf, pos).end()
+                if start >= len(buf) or (len(buf) - start < 10 and not eof):
+                    parts.append(buf[pos:start])
+                    pos = start
+                    need_more = not eof
+                    if eof:
+                        pos = len(buf)
+                    continue
+                if start + 9 < len(buf) and buf[start:start + 9].upper() == 'DELIMITER' and buf[start + 9] in ' \t':
+                    newline = buf.find('\n', start)
+                    if newline == -1 and not eof:
+                        need_more = True
+                        continue
+                    end = len(buf) if newline == -1 else newline + 1
+                    match = DELIMITER_COMMAND.match(buf, start, end)
+                    if match:
+                        delimiter = match.group(1)
+                    parts = []
+                    pos = end
+                    continue
+
+            if delimiter == ';':
+                run = PLAIN_RUN.match(buf, pos)
+                end = run.end() if run else pos
+                if end == len(buf) and not eof and buf[end - 1] in '-/':
+                    end -= 1  # Could be the start of -- or /* cut by the chunk
+                if end > pos:
+                    parts.append(buf[pos:end])
+                    pos = end
+                    continue
+
+            # Only look for the delimiter up to the next quote or comment, which keeps the scan linear
+            if special_stale or (special is not None and special.start() < pos):
+                special = SQL_SPECIAL.search(buf, pos)
+                special_stale = False
+            match = special
+            if match is None:
+                found = buf.find(delimiter, pos)
+            else:
+                found = buf.find(delimiter, pos, match.start() + len(delimiter) - 1)
+            if found != -1 and (match is None or found < match.start()):
+                parts.append(buf[pos:found])
+                statement = ''.join(parts).strip()
+                if statement:
+                    yield statement
+                parts = []
+                pos = found + len(delimiter)
+                continue
+
+            if match is None:
+                # Keep a tail that could be the start of a delimiter or comment cut by the chunk
+                keep = 0 if eof else max(len(delimiter), 2) - 1
+                safe = max(pos, len(buf) - keep)
+                parts.append(buf[pos:safe])
+                pos = safe
+                need_more = not eof
+                continue
+
+            start = match.start()
+            token = match.group()
+            if token in QUOTED:
+                # Take the whole literal at once when it ends inside the buffer
+                quoted = QUOTED[token].match(buf, start)
+                if quoted and (quoted.end() < len(buf) or eof):
+                    parts.append(buf[pos:quoted.end()])
+                    pos = quoted.end()
+                else:
+                    parts.append(buf[pos:start + 1])
+                    pos = start + 1
+                    state = token
+            elif token == '#':
+                parts.append(buf[pos:start])
+                pos = start + 1
+                state = '--'
+            elif start + 2 >= len(buf) and not eof:
+                # Need the character after -- or /* to know what it is
+                parts.append(buf[pos:start])
+                pos = start
+                need_more = True
+            elif token == '--':
+                if start + 2 >= len(buf) or buf[start + 2] in ' \t\r\n':
+                    parts.append(buf[pos:start])
+                    pos = start + 2
+                    state = '--'
+                else:
+                    # Only the first dash is plain text: in x--- c the next two start a comment
+                    parts.append(buf[pos:start + 1])
+                    pos = start + 1
+            elif start + 2 < len(buf) and buf[start + 2] in '!+':
+                # Executable comments and optimizer hints are meant for the server
+                parts.append(buf[pos:start + 2])
+                pos = start + 2
+                state = '/*!'
+            else:
+                parts.append(buf[pos:start] + ' ')
+                pos = start + 2
+                state = '/*'
+
+        elif state in QUOTE_END:
+            match = QUOTE_END[state].search(buf, pos)
+            if match is None:
+                parts.append(buf[pos:])
+                pos = len(buf)
+                continue
+            end = match.start()
+            if end + 1 >= len(buf) and not eof:
+                # An escape or a doubled quote may continue in the next chunk
+                parts.append(buf[pos:end])
+                pos = end
+                need_more = True
+            elif buf[end] == '\\':
+                parts.append(buf[pos:end + 2])
+                pos = end + 2
+            elif end + 1 < len(buf) and buf[end + 1] == state:
+                parts.append(buf[pos:end + 2])
+                pos = end + 2
+            else:
+                parts.append(buf[pos:end + 1])
+                pos = end + 1
+                state = None
+
+        elif state == '--':
+            newline = buf.find('\n', pos)
+            if newline == -1:
+                pos = len(buf)
+            else:
+                pos = newline
+                state = None
+
+        else:
+            end = buf.find('*/', pos)
+            if end == -1:
+                # Keep a trailing '*' that may be the start of the closing */
+                keep = max(pos, len(buf) - 1) if not eof else len(buf)
+                if state == '/*!':
+                    parts.append(buf[pos:keep])
+                pos = keep
+                need_more = not eof
+                continue
+            if state == '/*!':
+                parts.append(buf[pos:end + 2])
+            pos = end + 2
+            state = None
+
+    statement = ''.join(parts).strip()
+    if statement:
+        yield statement
+
+def execute_statements(connection, statements, batch_size=1000, batch_bytes=16 * 1024 * 1024, bulk_session=False):
+    """Execute statements on one cursor, committing once per batch of batch_size statements or batch_bytes of SQL.
+
+    If a statement fails, its whole batch is rolled back and the error is raised; batches committed
+    before it stay applied. DDL statements commit implicitly in MySQL, so keep them out of data batches.
+    With bulk_session, unique_checks and foreign_key_checks are turned off for the session and
+    restored afterwards. Returns the number of statements executed.
+    """
+    cursor = connection.cursor()
+    saved_session = None
+    if bulk_session:
+        cursor.execute("SELECT @@SESSION.unique_checks, @@SESSION.foreign_key_checks")
+        saved_session = cursor.fetchone()
+        cursor.execute("SET SESSION unique_checks = 0, foreign_key_checks = 0")
+
+    executed = 0
+    pending = 0
+    pending_bytes = 0
+    try:
+        connection.autocommit = False
+        for statement in statements:
+            cursor.execute(statement)
+            if cursor.with_rows:
+                cursor.fetchall()  # The cursor is reused, so result sets must be drained
+            executed += 1
+            pending += 1
+            pending_bytes += len(statement)
+            if pending >= batch_size or pending_bytes >= batch_bytes:
+                connection.commit()
+                pending = pending_bytes = 0
+        connection.commit()
+    except Error:
+        connection.rollback()  # Undo the whole failed batch
+        raise
+    finally:
+        if saved_session is not None:
+            try:
+                cursor.execute("SET SESSION unique_checks = %s, foreign_key_checks = %s", saved_session)
+            except Error as e:
+                print(f"Could not restore session settings: {e}")
+        cursor.close()
+
+    return executed
@@ -0,0 +1,202 @@
+import mysql.connector
+from typing import Dict, List, Any, Tuple
+import os
+from datetime import datetime
+
+from read_from_db import create_connection, close_connection, cache_database_schema, get_primary_key, plan_pk_chunks
+from delivery import build_column_encoders, encode_sql_value, write_sql_to_file
+
+# Define the base directory for the project
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))  # This can be set to a different path if needed
+
+def checksum_expression(column_names: List[str]) -> str:
+    """Build the per-row CRC32 expression; ISNULL tells a NULL apart from an empty string."""
+    parts = ', '.join(f"ISNULL(`{col}`), `{col}`" for col in column_names)
+    return f"CRC32(CONCAT_WS('#', {parts}))"
+
+def range_condition(pk: str, lower, upper) -> Tuple[str, List]:
+    """Build the WHERE clause and parameters for lower < pk <= upper, where None means unbounded."""
+    conditions, params = [], []
+    if lower is not None:
+        conditions.append(f"`{pk}` > %s")
+        params.append(lower)
+    if upper is not None:
+        conditions.append(f"`{pk}` <= %s")
+        params.append(upper)
+    return (f" WHERE {' AND '.join(conditions)}" if conditions else ''), params
+
+def chunk_checksum(cursor, table_name: str, pk: str, column_names: List[str], lower, upper) -> Tuple[int, int]:
+    """Return (row count, BIT_XOR of row checksums) of a primary key range, computed on the server."""
+    where, params = range_condition(pk, lower, upper)
+    cursor.execute(f"SELECT COUNT(*), IFNULL(BIT_XOR({checksum_expression(column_names)}), 0) "
+                   f"FROM `{table_name}`{where}", params)
+    count, checksum = cursor.fetchone()
+    return int(count), int(checksum)
+
+def split_range(cursor, table_name: str, pk: str, lower, upper, count: int, parts: int) -> List[List]:
+    """Split a primary key range into about `parts` ranges of equal row count, reading only the keys."""
+    step = max(1, -(-count // parts))
+    where, params = range_condition(pk, lower, upper)
+    cursor.execute(f"SELECT `{pk}` FROM (SELECT `{pk}`, ROW_NUMBER() OVER (ORDER BY `{pk}`) AS row_num "
+                   f"FROM `{table_name}`{where}) AS numbered WHERE MOD(row_num, %s) = 0 ORDER BY `{pk}`",
+                   params + [step])
+    boundaries = [row[0] for row in cursor.fetchall() if row[0] != upper]
+    bounds = [lower] + boundaries + [upper]
+    return [[bounds[i], bounds[i + 1]] for i in range(len(bounds) - 1)]
+
+def fetch_range(cursor, table_name: str, pk: str, column_names: List[str], lower, upper) -> Dict[Any, Dict]:
+    """Fetch the rows of a primary key range, keyed by primary key."""
+    where, params = range_condition(pk, lower, upper)
+    column_list = ', '.join(f"`{col}`" for col in column_names)
+    cursor.execute(f"SELECT {column_list} FROM `{table_name}`{where} ORDER BY `{pk}`", params)
+    return {row[column_names.index(pk)]: dict(zip(column_names, row)) for row in cursor.fetchall()}
+
+def diff_rows(table_name: str, pk: str, column_names: List[str], source_rows: Dict, target_rows: Dict,
+              encoders: Dict) -> List[str]:
+    """Build the INSERT, UPDATE and DELETE statements that turn target_rows into source_rows."""
+    def encode(col, val):
+        return encoders.get(col, encode_sql_value)(val)
+
+    statements = []
+    column_list = ', '.join(f"`{col}`" for col in column_names)
+    for key, row in source_rows.items():
+        if key not in target_rows:
+            values = ', '.join(encode(col, row[col]) for col in column_names)
+            statements.append(f"INSERT INTO `{table_name}` ({column_list}) VALUES ({values});")
+        elif target_rows[key] != row:
+            changes = ', '.join(f"`{col}` = {encode(col, row[col])}" for col in column_names
+                                if row[col] != target_rows[key][col])
+            statements.append(f"UPDATE `{table_name}` SET {changes} WHERE `{pk}` = {encode(pk, key)};")
+    deleted = [key for key in target_rows if key not in source_rows]
+    if deleted:
+        statements.append(f"DELETE FROM `{table_name}` WHERE `{pk}` IN "
+                          f"({', '.join(encode(pk, key) for key in deleted)});")
+    return statements
+
+def sync_table(source_cursor, target_cursor, table_name: str, table_info: Dict, column_names: List[str],
+               chunk_rows: int = 100000, leaf_rows: int = 1000, fanout: int = 16) -> Dict:
+    """Compare one table on both servers by chunk checksums and return the statements that fix the target.
+
+    The primary key space is cut into chunks of about chunk_rows rows. Chunks whose count and
+    BIT_XOR(CRC32(...)) match are skipped. Chunks that differ are split into `fanout` parts
+    until they hold at most leaf_rows rows, and only those are fetched and compared row by row.
+    """
+    pk = get_primary_key(table_info)
+    stats = {"chunks": 0, "different": 0, "rows_fetched": 0, "statements": []}
+    encoders = build_column_encoders({col: table_info['columns'][col] for col in column_names})
+
+    source_cursor.execute("SELECT TABLE_ROWS FROM INFORMATION_SCHEMA.TABLES "
+                          "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s", (table_name,))
+    row = source_cursor.fetchone()
+    estimated_rows = int(row[0] or 0) if row else 0
+    ranges = plan_pk_chunks(source_cursor, table_name, pk, table_info['columns'][pk], estimated_rows, chunk_rows)
+
+    while ranges:
+        lower, upper = ranges.pop()
+        stats['chunks'] += 1
+        source_count, source_checksum = chunk_checksum(source_cursor, table_name, pk, column_names, lower, upper)
+        target_count, target_checksum = chunk_checksum(target_cursor, table_name, pk, column_names, lower, upper)
+        if (source_count, source_checksum) == (target_count, target_checksum):
+            continue
+        stats['different'] += 1
+
+        if max(source_count, target_count) > leaf_rows:
+            # Split on the keys of the side with more rows, so the parts shrink on both sides
+            cursor = source_cursor if source_count >= target_count else target_cursor
+            parts = split_range(cursor, table_name, pk, lower, upper, max(source_count, target_count), fanout)
+            if len(parts) > 1:
+                ranges.extend(parts)
+                continue
+
+        source_rows = fetch_range(source_cursor, table_name, pk, column_names, lower, upper)
+        target_rows = fetch_range(target_cursor, table_name, pk, column_names, lower, upper)
+        stats['rows_fetched'] += len(source_rows) + len(target_rows)
+        stats['statements'].extend(diff_rows(table_name, pk, column_names, source_rows, target_rows, encoders))
+
+    return stats
+
+def apply_statements(connection, statements: List[str], batch_size: int = 1000) -> None:
+    """Apply sync statements on the target in transactions of batch_size, with foreign key checks off.
+
+    The session's own foreign_key_checks and autocommit settings are put back afterwards.
+    """
+    cursor = connection.cursor()
+    cursor.execute("SELECT @@SESSION.foreign_key_checks")
+    foreign_key_checks = int(cursor.fetchone()[0])
+    autocommit = connection.autocommit
+    try:
+        cursor.execute("SET SESSION foreign_key_checks = 0")  # Tables are synced one at a time, in any order
+        connection.autocommit = False
+        for start in range(0, len(statements), batch_size):
+            for statement in statements[start:start + batch_size]:
+                cursor.execute(statement)
+            connection.commit()
+    except mysql.connector.Error:
+        connection.rollback()
+        raise
+    finally:
+        cursor.execute(f"SET SESSION foreign_key_checks = {foreign_key_checks}")
+        connection.autocommit = autocommit
+        cursor.close()
+
+def sync_databases(source_connection, target_connection, output_file: str = None, apply: bool = False,
+                   tables: List[str] = None, chunk_rows: int = 100000, leaf_rows: int = 1000) -> Dict[str, Dict]:
+    """Bring the target's data in line with the source by moving only the rows that differ.
+
+    Tables present on both sides with a single-column primary key are compared on their common
+    columns; other tables are reported and skipped. The statements are written to output_file
+    and/or applied on the target. Rows changing on either side during the sync are not tracked.
+    """
+    source_schema = cache_database_schema(source_connection)
+    target_schema = cache_database_schema(target_connection)
+    source_cursor = source_connection.cursor()
+    target_cursor = target_connection.cursor()
+
+    summary = {}
+    statements = []
+    try:
+        for table_name, table_info in source_schema.items():
+            if tables is not None and table_name not in tables:
+                continue
+            if table_name not in target_schema:
+                print(f"Skipping table {table_name}: missing on the target")
+                continue
+            if get_primary_key(table_info) is None:
+                print(f"Skipping table {table_name}: no single-column primary key")
+                continue
+            column_names = [col for col in table_info['columns'] if col in target_schema[table_name]['columns']]
+            stats = sync_table(source_cursor, target_cursor, table_name, table_info, column_names, chunk_rows,
+                               leaf_rows)
+            statements.extend(stats['statements'])
+            summary[table_name] = {key: value for key, value in stats.items() if key != 'statements'}
+            summary[table_name]['changes'] = len(stats['statements'])
+            print(f"{table_name}: {stats['different']}/{stats['chunks']} chunks differ, "
+                  f"{stats['rows_fetched']} rows fetched, {len(stats['statements'])} statements")
+    finally:
+        source_cursor.close()
+        target_cursor.close()
+
+    if output_file:
+        os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+        write_sql_to_file(["SET NAMES utf8mb4;", "SET foreign_key_checks = 0;"] + statements +
+                          ["SET foreign_key_checks = 1;"], output_file)
+        print(f"Sync statements written to '{output_file}'.")
+    if apply and statements:
+        apply_statements(target_connection, statements)
+        print(f"Applied {len(statements)} statements on the target.")
+    return summary
+
+if __name__ == "__main__":
+    source = {"host": "localhost", "user": "root", "password": "", "database": ""}  # Database to copy from
+    target = {"host": "localhost", "user": "root", "password": "", "database": ""}  # Database to bring in line
+    apply = False  # Set to True to run the statements on the target instead of only writing them
+
+    source_connection = create_connection(**source)
+    target_connection = create_connection(**target)
+    if source_connection and target_connection:
+        current_time = datetime.now().strftime("%Y%m%d_%H%M%S")
+        sync_databases(source_connection, target_connection,
+                       os.path.join(BASE_DIR, f'sql/sync/{current_time}_sync.sql'), apply)
+    for connection in (source_connection, target_connection):
+        if connection:
+            close_connection(connection)
@@ -0,0 +1,48 @@
+import gzip
+import io
+
+import pytest
+
+from sql_statements import iter_sql_statements, open_sql_file
+
+def split(sql, chunk_size=1024 * 1024):
+    return list(iter_sql_statements(io.StringIO(sql), chunk_size))
+
+# Every case is also split with tiny chunks, so tokens cut by a chunk boundary are covered
+CHUNK_SIZES = [1, 2, 3, 5, 7, 64]
+
+CASES = [
+    ("SELECT 1; SELECT 2;", ["SELECT 1", "SELECT 2"]),
+    ("SELECT 1;\nSELECT 2", ["SELECT 1", "SELECT 2"]),  # Last statement without a delimiter
+    ("INSERT INTO t VALUES ('a;b', \"c;d\", `e;f`);", ["INSERT INTO t VALUES ('a;b', \"c;d\", `e;f`)"]),
+    ("SELECT 'it''s; fine', 'back\\'slash;';", ["SELECT 'it''s; fine', 'back\\'slash;'"]),
+    ("SELECT \"say \"\"hi\"\";\";", ["SELECT \"say \"\"hi\"\";\""]),
+    ("SELECT `odd``name;`;", ["SELECT `odd``name;`"]),
+    ("-- comment; here\nSELECT 1; # another; one\nSELECT 2;", ["SELECT 1", "SELECT 2"]),
+    ("SELECT 1 /* block; comment */ + 1;", ["SELECT 1   + 1"]),
+    ("SELECT 5--1;", ["SELECT 5--1"]),  # -- without a space is not a comment
+    ("SELECT 1--- c; x\n;", ["SELECT 1-"]),  # Odd dash runs: the last two dashes start the comment
+    ("SELECT 1---- c; x\n;", ["SELECT 1--"]),
+    ("/*!40101 SET NAMES utf8mb4 */;\nSELECT /*+ MAX_EXECUTION_TIME(1) */ 1;",
+     ["/*!40101 SET NAMES utf8mb4 */", "SELECT /*+ MAX_EXECUTION_TIME(1) */ 1"]),
+    ("DELIMITER $$\nCREATE PROCEDURE p() BEGIN SELECT 1; SELECT 2; END$$\nDELIMITER ;\nCALL p();",
+     ["CREATE PROCEDURE p() BEGIN SELECT 1; SELECT 2; END", "CALL p()"]),
+    ("DELIMITER //\nSELECT '//'; SELECT 1//\nDELIMITER ;\n", ["SELECT '//'; SELECT 1"]),
+    ("  ;\n;\n", []),
+]
+
+@pytest.mark.parametrize("sql, expected", CASES)
+def test_split(sql, expected):
+    assert split(sql) == expected
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+@pytest.mark.parametrize("sql, expected", CASES)
+def test_split_across_chunks(sql, expected, chunk_size):
+    assert split(sql, chunk_size) == expected
+
+def test_open_sql_file_gzip(tmp_path):
+    path = tmp_path / "data.sql.gz"
+    with gzip.open(path, 'wt', encoding='utf-8') as f:
+        f.write("INSERT INTO t VALUES ('é;');\nSELECT 1;\n")
+    with open_sql_file(str(path)) as f:
+        assert list(iter_sql_statements(f)) == ["INSERT INTO t VALUES ('é;')", "SELECT 1"]